@@ -0,0 +1,40 @@
+"""Add full-text search over tests and questions
+
+Revision ID: 5b1f3c2a9d47
+Revises: 0f872d089e69
+Create Date: 2026-10-19 10:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1f3c2a9d47'
+down_revision: Union[str, None] = '0f872d089e69'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Генерируемые tsvector-колонки и GIN-индексы (только PostgreSQL, см. app/models.py)
+    op.execute(
+        "ALTER TABLE tests ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED"
+    )
+    op.create_index('ix_tests_search_vector', 'tests', ['search_vector'], unique=False, postgresql_using='gin')
+    op.execute(
+        "ALTER TABLE questions ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "to_tsvector('simple', coalesce(question_text, ''))) STORED"
+    )
+    op.create_index('ix_questions_search_vector', 'questions', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_questions_search_vector', table_name='questions')
+    op.drop_column('questions', 'search_vector')
+    op.drop_index('ix_tests_search_vector', table_name='tests')
+    op.drop_column('tests', 'search_vector')
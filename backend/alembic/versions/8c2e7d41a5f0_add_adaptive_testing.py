@@ -0,0 +1,32 @@
+"""Add adaptive testing mode and IRT item parameters
+
+Revision ID: 8c2e7d41a5f0
+Revises: 5b1f3c2a9d47
+Create Date: 2026-10-19 12:47:03.274915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2e7d41a5f0'
+down_revision: Union[str, None] = '5b1f3c2a9d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tests', sa.Column('is_adaptive', sa.Boolean(), server_default=sa.false(), nullable=True))
+    op.add_column('tests', sa.Column('adaptive_max_items', sa.Integer(), nullable=True))
+    op.add_column('questions', sa.Column('irt_discrimination', sa.Float(), nullable=True))
+    op.add_column('questions', sa.Column('irt_difficulty', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('questions', 'irt_difficulty')
+    op.drop_column('questions', 'irt_discrimination')
+    op.drop_column('tests', 'adaptive_max_items')
+    op.drop_column('tests', 'is_adaptive')
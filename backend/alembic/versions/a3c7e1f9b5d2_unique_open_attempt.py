@@ -0,0 +1,41 @@
+"""Allow one unfinished attempt per user and test
+
+Revision ID: a3c7e1f9b5d2
+Revises: f2b6c9e4a8d3
+Create Date: 2026-10-19 18:05:42.518306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c7e1f9b5d2'
+down_revision: Union[str, None] = 'f2b6c9e4a8d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Лишние незавершенные попытки (оставшиеся от гонки в start_test) закрываем так же, как complete_test:
+    # балл по их ответам, максимум — по вопросам теста (в адаптивном — только по заданным);
+    # открытой остается самая новая — ее и продолжал бы start_test
+    op.execute(
+        "UPDATE test_results t SET completed_at = now(), "
+        "score = (SELECT coalesce(sum(a.points_earned), 0) FROM answers a WHERE a.test_result_id = t.id), "
+        "max_score = CASE WHEN (SELECT is_adaptive FROM tests WHERE tests.id = t.test_id) "
+        "THEN (SELECT coalesce(sum(q.points), 0) FROM answers a JOIN questions q ON q.id = a.question_id "
+        "WHERE a.test_result_id = t.id) "
+        "ELSE (SELECT coalesce(sum(q.points), 0) FROM questions q WHERE q.test_id = t.test_id) END "
+        "WHERE t.completed_at IS NULL AND EXISTS ("
+        "SELECT 1 FROM test_results n WHERE n.test_id = t.test_id AND n.user_id = t.user_id "
+        "AND n.completed_at IS NULL AND (n.started_at, n.id) > (t.started_at, t.id))"
+    )
+    op.create_index('uq_test_results_open_attempt', 'test_results', ['test_id', 'user_id'], unique=True,
+                    postgresql_where=sa.text('completed_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('uq_test_results_open_attempt', table_name='test_results')
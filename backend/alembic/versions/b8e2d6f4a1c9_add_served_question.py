@@ -0,0 +1,29 @@
+"""Track the question served by an adaptive attempt
+
+Revision ID: b8e2d6f4a1c9
+Revises: a3c7e1f9b5d2
+Create Date: 2026-10-19 18:42:17.093516
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2d6f4a1c9'
+down_revision: Union[str, None] = 'a3c7e1f9b5d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('test_results', sa.Column('served_question_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('test_results_served_question_id_fkey', 'test_results', 'questions',
+                          ['served_question_id'], ['id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('test_results_served_question_id_fkey', 'test_results', type_='foreignkey')
+    op.drop_column('test_results', 'served_question_id')
@@ -0,0 +1,34 @@
+"""Add answers.created_at for archival and time partitioning
+
+Revision ID: c4d9a1e6b3f2
+Revises: 8c2e7d41a5f0
+Create Date: 2026-10-19 14:05:52.860417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d9a1e6b3f2'
+down_revision: Union[str, None] = '8c2e7d41a5f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('answers', sa.Column('created_at', sa.DateTime(), nullable=True))
+    # Для старых ответов точного времени нет — берем начало попытки
+    op.execute(
+        "UPDATE answers SET created_at = test_results.started_at "
+        "FROM test_results WHERE test_results.id = answers.test_result_id"
+    )
+    op.execute("UPDATE answers SET created_at = now() WHERE created_at IS NULL")
+    op.create_index(op.f('ix_answers_test_result_id'), 'answers', ['test_result_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_answers_test_result_id'), table_name='answers')
+    op.drop_column('answers', 'created_at')
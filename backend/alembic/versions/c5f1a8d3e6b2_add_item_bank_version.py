@@ -0,0 +1,26 @@
+"""Version the adaptive item bank of a test
+
+Revision ID: c5f1a8d3e6b2
+Revises: b8e2d6f4a1c9
+Create Date: 2026-10-19 20:14:36.580142
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f1a8d3e6b2'
+down_revision: Union[str, None] = 'b8e2d6f4a1c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tests', sa.Column('item_bank_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('tests', 'item_bank_version')
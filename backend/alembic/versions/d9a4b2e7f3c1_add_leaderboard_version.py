@@ -0,0 +1,26 @@
+"""Version leaderboard entries per test
+
+Revision ID: d9a4b2e7f3c1
+Revises: c5f1a8d3e6b2
+Create Date: 2026-10-19 20:52:08.314795
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a4b2e7f3c1'
+down_revision: Union[str, None] = 'c5f1a8d3e6b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tests', sa.Column('leaderboard_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('tests', 'leaderboard_version')
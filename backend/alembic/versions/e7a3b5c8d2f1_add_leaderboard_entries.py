@@ -0,0 +1,42 @@
+"""Add leaderboard_entries summary table
+
+Revision ID: e7a3b5c8d2f1
+Revises: c4d9a1e6b3f2
+Create Date: 2026-10-19 15:31:26.402871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3b5c8d2f1'
+down_revision: Union[str, None] = 'c4d9a1e6b3f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('leaderboard_entries',
+    sa.Column('test_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('best_score', sa.Integer(), nullable=False),
+    sa.Column('test_result_id', sa.Integer(), nullable=True),
+    sa.Column('achieved_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['test_id'], ['tests.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('test_id', 'user_id')
+    )
+    # Лучший результат каждого пользователя по уже завершенным попыткам
+    op.execute(
+        "INSERT INTO leaderboard_entries (test_id, user_id, best_score, test_result_id, achieved_at) "
+        "SELECT DISTINCT ON (test_id, user_id) test_id, user_id, score, id, completed_at "
+        "FROM test_results WHERE completed_at IS NOT NULL AND score IS NOT NULL "
+        "ORDER BY test_id, user_id, score DESC, completed_at"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('leaderboard_entries')
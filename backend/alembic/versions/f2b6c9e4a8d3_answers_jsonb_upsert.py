@@ -0,0 +1,59 @@
+"""Store answers as JSONB, one row per question per attempt
+
+Revision ID: f2b6c9e4a8d3
+Revises: e7a3b5c8d2f1
+Create Date: 2026-10-19 16:48:10.937254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6c9e4a8d3'
+down_revision: Union[str, None] = 'e7a3b5c8d2f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column('questions', 'options', type_=postgresql.JSONB(), postgresql_using='options::jsonb')
+    op.alter_column('questions', 'correct_answer', type_=postgresql.JSONB(), postgresql_using='correct_answer::jsonb')
+    op.alter_column('answers', 'answer_content', type_=postgresql.JSONB(), postgresql_using='answer_content::jsonb')
+    op.add_column('answers', sa.Column('idempotency_key', sa.String(), nullable=True))
+    # Из повторных отправок оставляем последнюю — так же, как ее увидел бы upsert
+    op.execute(
+        "DELETE FROM answers a USING answers b "
+        "WHERE a.test_result_id = b.test_result_id AND a.question_id = b.question_id AND a.id < b.id"
+    )
+    # Баллы попыток, завершенных с дубликатами, пересчитываем по оставшимся ответам
+    op.execute(
+        "UPDATE test_results SET score = s.score FROM ("
+        "SELECT test_result_id, coalesce(sum(points_earned), 0) AS score FROM answers GROUP BY test_result_id"
+        ") s WHERE s.test_result_id = test_results.id AND test_results.completed_at IS NOT NULL"
+    )
+    # Лучшие результаты в leaderboard_entries (e7a3b5c8d2f1) считались по баллам с дубликатами — строим заново
+    op.execute("DELETE FROM leaderboard_entries")
+    op.execute(
+        "INSERT INTO leaderboard_entries (test_id, user_id, best_score, test_result_id, achieved_at) "
+        "SELECT DISTINCT ON (test_id, user_id) test_id, user_id, score, id, completed_at "
+        "FROM test_results WHERE completed_at IS NOT NULL AND score IS NOT NULL "
+        "ORDER BY test_id, user_id, score DESC, completed_at"
+    )
+    # created_at ответа — начало попытки (на нем держится ключ секционированной таблицы, см. app.archive)
+    op.execute(
+        "UPDATE answers SET created_at = t.started_at FROM test_results t "
+        "WHERE t.id = answers.test_result_id AND answers.created_at IS DISTINCT FROM t.started_at"
+    )
+    op.create_unique_constraint('uq_answers_test_result_question', 'answers', ['test_result_id', 'question_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_answers_test_result_question', 'answers', type_='unique')
+    op.drop_column('answers', 'idempotency_key')
+    op.alter_column('answers', 'answer_content', type_=sa.JSON(), postgresql_using='answer_content::json')
+    op.alter_column('questions', 'correct_answer', type_=sa.JSON(), postgresql_using='correct_answer::json')
+    op.alter_column('questions', 'options', type_=sa.JSON(), postgresql_using='options::json')
@@ -0,0 +1,126 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Адаптивное тестирование (CAT) по модели IRT (Rasch / 2PL).
+# Для каждого теста один раз строятся таблицы на сетке способностей:
+# log P, log(1 - P) и информация вопроса a^2 * P * (1 - P). После этого оценка способности (EAP)
+# и выбор следующего вопроса — это несколько векторных операций над готовыми массивами.
+
+THETA_GRID = np.linspace(-4.0, 4.0, 81)
+# Нормальное априорное распределение N(0, 1) на сетке
+LOG_PRIOR = -0.5 * THETA_GRID ** 2
+# Тест заканчивается, когда стандартная ошибка оценки опускается ниже этого порога
+TARGET_STANDARD_ERROR = 0.3
+# Минимум ответов на вопрос для калибровки; у остальных остаются параметры по умолчанию (a=1, b=0)
+MIN_CALIBRATION_RESPONSES = 20
+
+
+class ItemBank:
+    def __init__(self, question_ids: List[int], discrimination: np.ndarray, difficulty: np.ndarray,
+                 version: int = 0):
+        self.version = version  # tests.item_bank_version, по которому построен банк
+        self.question_ids = np.asarray(question_ids, dtype=np.int64)
+        self.index = {question_id: i for i, question_id in enumerate(question_ids)}
+        # Таблицы размера (len(THETA_GRID), число вопросов)
+        p = 1.0 / (1.0 + np.exp(-discrimination[None, :] * (THETA_GRID[:, None] - difficulty[None, :])))
+        p = np.clip(p, 1e-9, 1 - 1e-9)
+        self.log_p = np.log(p)
+        self.log_q = np.log1p(-p)
+        self.information = discrimination[None, :] ** 2 * p * (1.0 - p)
+
+    def estimate(self, responses: List[Tuple[int, bool]]) -> Tuple[float, float]:
+        """EAP-оценка способности и ее стандартная ошибка по ответам (question_id, is_correct)."""
+        log_posterior = LOG_PRIOR.copy()
+        if responses:
+            columns = np.array([self.index[question_id] for question_id, _ in responses if question_id in self.index],
+                               dtype=np.int64)
+            correct = np.array([bool(is_correct) for question_id, is_correct in responses if question_id in self.index])
+            if columns.size:
+                log_posterior += self.log_p[:, columns[correct]].sum(axis=1)
+                log_posterior += self.log_q[:, columns[~correct]].sum(axis=1)
+        weights = np.exp(log_posterior - log_posterior.max())
+        weights /= weights.sum()
+        theta = float(weights @ THETA_GRID)
+        standard_error = float(np.sqrt(weights @ (THETA_GRID - theta) ** 2))
+        return theta, standard_error
+
+    def select(self, theta: float, answered_ids) -> Optional[int]:
+        """Вопрос с максимальной информацией в точке theta среди еще не заданных."""
+        information = self.information[int(np.abs(THETA_GRID - theta).argmin())].copy()
+        answered = [self.index[question_id] for question_id in answered_ids if question_id in self.index]
+        if answered:
+            information[answered] = -np.inf
+        best = int(information.argmax())
+        if information[best] == -np.inf:
+            return None
+        return int(self.question_ids[best])
+
+
+_banks: Dict[int, ItemBank] = {}
+_lock = threading.Lock()
+
+
+def get_item_bank(test_id: int, load_items, version: int = 0) -> ItemBank:
+    """Банк вопросов теста из кеша; load_items() -> [(question_id, discrimination, difficulty)].
+
+    Кеш у каждого процесса свой, поэтому банк перестраивается, когда version (tests.item_bank_version)
+    не совпадает с версией, по которой он построен: так изменения из других процессов тоже подхватываются.
+    """
+    bank = _banks.get(test_id)
+    if bank is None or bank.version != version:
+        items = load_items()
+        bank = ItemBank(
+            [question_id for question_id, _, _ in items],
+            np.array([a if a is not None else 1.0 for _, a, _ in items], dtype=np.float64),
+            np.array([b if b is not None else 0.0 for _, _, b in items], dtype=np.float64),
+            version=version,
+        )
+        with _lock:
+            _banks[test_id] = bank
+    return bank
+
+
+def calibrate(question_ids: np.ndarray, result_ids: np.ndarray, is_correct: np.ndarray, model: str = "2pl"):
+    """Приближенная калибровка параметров по историческим ответам (метод моментов).
+
+    Сложность b — логит доли неверных ответов, дискриминация a (для 2PL) — из точечно-бисериальной
+    корреляции ответа с результатом попытки. Возвращает {question_id: (a, b)} для вопросов,
+    на которые есть хотя бы MIN_CALIBRATION_RESPONSES ответов.
+    """
+    if question_ids.size == 0:
+        return {}
+    items, item_index = np.unique(question_ids, return_inverse=True)
+    _, result_index = np.unique(result_ids, return_inverse=True)
+    correct = is_correct.astype(np.float64)
+
+    # Доля верных ответов в попытке как наблюдаемая оценка способности
+    result_score = np.bincount(result_index, weights=correct) / np.bincount(result_index)
+    score = result_score[result_index]
+
+    n = np.bincount(item_index, minlength=items.size).astype(np.float64)
+    n_correct = np.bincount(item_index, weights=correct, minlength=items.size)
+    # Сглаживание, чтобы вопросы, на которые ответили все (или никто), не уходили в бесконечность
+    p = (n_correct + 0.5) / (n + 1.0)
+
+    if model == "rasch":
+        a = np.ones(items.size)
+    else:
+        sum_score = np.bincount(item_index, weights=score, minlength=items.size)
+        sum_score_sq = np.bincount(item_index, weights=score ** 2, minlength=items.size)
+        sum_score_correct = np.bincount(item_index, weights=score * correct, minlength=items.size)
+        mean_score = sum_score / n
+        var_score = np.maximum(sum_score_sq / n - mean_score ** 2, 1e-12)
+        p_raw = n_correct / n
+        covariance = sum_score_correct / n - mean_score * p_raw
+        r = covariance / np.sqrt(var_score * np.maximum(p_raw * (1 - p_raw), 1e-12))
+        r = np.clip(r, 0.05, 0.95)
+        a = np.clip(1.702 * r / np.sqrt(1 - r ** 2), 0.25, 2.5)
+
+    b = -np.log(p / (1 - p)) / a
+    calibrated = n >= MIN_CALIBRATION_RESPONSES
+    return {
+        int(question_id): (float(a_i), float(b_i))
+        for question_id, a_i, b_i in zip(items[calibrated], a[calibrated], b[calibrated])
+    }
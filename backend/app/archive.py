@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import text
+from sqlalchemy.orm import Session, joinedload
+
+from . import models
+
+# Архив завершенных попыток: Parquet (zstd), разбитый на каталоги test_id=<id>/month=<YYYY-MM>.
+# Одна строка на ответ, поля попытки повторяются в каждой строке; попытка без ответов — одна строка
+# с пустыми полями ответа.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS") or "180")
+ARCHIVE_BATCH_SIZE = 1000
+# Общая схема всех файлов архива. Без нее тип столбца выводится из каждой пачки отдельно: в пачке только из
+# попыток без ответов answer_content целиком пустой и записывается с типом null, а такие файлы
+# не читаются вместе с остальными.
+ARCHIVE_SCHEMA = pa.schema([
+    ("test_result_id", pa.int64()),
+    ("test_id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("score", pa.int64()),
+    ("max_score", pa.int64()),
+    ("started_at", pa.timestamp("us")),
+    ("completed_at", pa.timestamp("us")),
+    ("month", pa.string()),
+    ("answer_id", pa.int64()),
+    ("question_id", pa.int64()),
+    ("answer_content", pa.string()),
+    ("is_correct", pa.bool_()),
+    ("points_earned", pa.int64()),
+])
+
+
+def _rows(test_results: List[models.TestResult]) -> List[dict]:
+    rows = []
+    for test_result in test_results:
+        base = {
+            "test_result_id": test_result.id,
+            "test_id": test_result.test_id,
+            "user_id": test_result.user_id,
+            "score": test_result.score,
+            "max_score": test_result.max_score,
+            "started_at": test_result.started_at,
+            "completed_at": test_result.completed_at,
+            "month": test_result.completed_at.strftime("%Y-%m"),
+        }
+        if not test_result.answers:
+            rows.append({**base, "answer_id": None, "question_id": None, "answer_content": None,
+                         "is_correct": None, "points_earned": None})
+        for answer in test_result.answers:
+            rows.append({
+                **base,
+                "answer_id": answer.id,
+                "question_id": answer.question_id,
+                "answer_content": json.dumps(answer.answer_content, ensure_ascii=False),
+                "is_correct": answer.is_correct,
+                "points_earned": answer.points_earned,
+            })
+    return rows
+
+
+def archive_completed_results(db: Session, older_than_days: int = ARCHIVE_RETENTION_DAYS, archive_dir: Optional[str] = None):
+    """Переносит завершенные попытки старше older_than_days дней (вместе с ответами) из базы в Parquet.
+
+    Каждая пачка сначала записывается на диск и только потом удаляется из базы; если процесс упадет
+    между этими шагами, повторный запуск запишет пачку еще раз, а чтение архива уберет дубликаты.
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived_results = archived_answers = 0
+    while True:
+        test_results = db.query(models.TestResult).options(joinedload(models.TestResult.answers)).filter(
+            models.TestResult.completed_at.isnot(None),
+            models.TestResult.completed_at < cutoff
+        ).order_by(models.TestResult.id).limit(ARCHIVE_BATCH_SIZE).all()
+        if not test_results:
+            break
+
+        df = pd.DataFrame(_rows(test_results), columns=ARCHIVE_SCHEMA.names)
+        df.to_parquet(archive_dir, partition_cols=["test_id", "month"], compression="zstd", index=False,
+                      schema=ARCHIVE_SCHEMA)
+
+        result_ids = [test_result.id for test_result in test_results]
+        archived_answers += db.query(models.Answer).filter(
+            models.Answer.test_result_id.in_(result_ids)
+        ).delete(synchronize_session=False)
+        db.query(models.TestResult).filter(models.TestResult.id.in_(result_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.expunge_all()
+        archived_results += len(result_ids)
+    return {"archived_results": archived_results, "archived_answers": archived_answers}
+
+
+def read_archived_results(test_id: Optional[int] = None, user_id: Optional[int] = None, archive_dir: Optional[str] = None):
+    """Попытки из архива в формате schemas.TestResult. Фильтр по test_id отсекает лишние каталоги."""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not os.path.isdir(archive_dir):
+        return []
+    filters = []
+    if test_id:
+        filters.append(("test_id", "=", test_id))
+    if user_id:
+        filters.append(("user_id", "=", user_id))
+    # Со схемой читаются и файлы, записанные до ее появления (answer_content с типом null)
+    df = pd.read_parquet(archive_dir, filters=filters or None, schema=ARCHIVE_SCHEMA)
+    if df.empty:
+        return []
+    df = df.drop_duplicates(subset=["test_result_id", "answer_id"])
+
+    results = []
+    for test_result_id, group in df.groupby("test_result_id", sort=True):
+        first = group.iloc[0]
+        answers = [
+            {
+                "id": int(row.answer_id),
+                "question_id": int(row.question_id),
+                "answer_content": json.loads(row.answer_content),
+                "is_correct": bool(row.is_correct) if pd.notna(row.is_correct) else False,
+                "points_earned": int(row.points_earned) if pd.notna(row.points_earned) else 0,
+            }
+            for row in group.itertuples()
+            if pd.notna(row.answer_id)
+        ]
+        results.append({
+            "id": int(test_result_id),
+            "test_id": int(first.test_id),
+            "user_id": int(first.user_id),
+            "score": int(first.score) if pd.notna(first.score) else None,
+            "max_score": int(first.max_score) if pd.notna(first.max_score) else None,
+            "started_at": first.started_at.to_pydatetime(),
+            "completed_at": first.completed_at.to_pydatetime(),
+            "answers": answers,
+        })
+    return results
+
+
+# Секционирование живой таблицы answers по месяцам (только PostgreSQL, опционально).
+# Таблица превращается в RANGE-секционированную по created_at; ключ секционирования обязан входить
+# в первичный ключ, поэтому он становится (id, created_at). Архивировать старые месяцы после этого
+# можно отсоединением секции вместо DELETE.
+def _create_month_partitions(db: Session, first_month: Optional[datetime], months_ahead: int):
+    today = datetime.utcnow().date().replace(day=1)
+    month = first_month.date() if first_month else today
+    last = (today + timedelta(days=32 * months_ahead)).replace(day=1)
+    while month <= last:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS answers_{month:%Y_%m} PARTITION OF answers "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+        ))
+        month = next_month
+
+
+def ensure_answer_partitions(db: Session, months_ahead: int = 3):
+    """Создает недостающие месячные секции answers на months_ahead месяцев вперед (запускать по расписанию)."""
+    first_month = db.execute(text("SELECT date_trunc('month', min(created_at)) FROM answers")).scalar()
+    _create_month_partitions(db, first_month, months_ahead)
+    db.commit()
+
+
+def partition_answers_table(db: Session, months_ahead: int = 3):
+    is_partitioned = db.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'answers')"
+    )).scalar()
+    if is_partitioned:
+        ensure_answer_partitions(db, months_ahead)
+        return
+    for statement in (
+        "LOCK TABLE answers IN ACCESS EXCLUSIVE MODE",
+        "ALTER TABLE answers RENAME TO answers_unpartitioned",
+        # Имена индексов уникальны в схеме — освобождаем их для новой таблицы
+        "ALTER TABLE answers_unpartitioned RENAME CONSTRAINT answers_pkey TO answers_unpartitioned_pkey",
+        "ALTER INDEX ix_answers_test_result_id RENAME TO ix_answers_unpartitioned_test_result_id",
+        "ALTER TABLE answers_unpartitioned RENAME CONSTRAINT uq_answers_test_result_question "
+        "TO uq_answers_unpartitioned_test_result_question",
+        "CREATE TABLE answers (LIKE answers_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)",
+        "ALTER TABLE answers ALTER COLUMN created_at SET NOT NULL",
+        "ALTER TABLE answers ADD PRIMARY KEY (id, created_at)",
+        # created_at — начало попытки, поэтому ключ по-прежнему означает «один ответ на вопрос в попытке»
+        "ALTER TABLE answers ADD CONSTRAINT uq_answers_test_result_question "
+        "UNIQUE (test_result_id, question_id, created_at)",
+        "ALTER TABLE answers ADD FOREIGN KEY (test_result_id) REFERENCES test_results (id)",
+        "ALTER TABLE answers ADD FOREIGN KEY (question_id) REFERENCES questions (id)",
+        "CREATE INDEX ix_answers_test_result_id ON answers (test_result_id)",
+        "CREATE TABLE answers_default PARTITION OF answers DEFAULT",
+        "ALTER SEQUENCE answers_id_seq OWNED BY answers.id",
+    ):
+        db.execute(text(statement))
+    # Секции создаются до копирования, чтобы строки не оседали в answers_default
+    first_month = db.execute(text("SELECT date_trunc('month', min(created_at)) FROM answers_unpartitioned")).scalar()
+    _create_month_partitions(db, first_month, months_ahead)
+    db.execute(text("INSERT INTO answers SELECT * FROM answers_unpartitioned"))
+    db.execute(text("DROP TABLE answers_unpartitioned"))
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archival of completed test results")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser("run", help="move completed results older than the retention window to Parquet")
+    run.add_argument("--days", type=int, default=ARCHIVE_RETENTION_DAYS)
+    partition = subparsers.add_parser("partition-answers", help="partition the answers table by month (PostgreSQL)")
+    partition.add_argument("--months-ahead", type=int, default=3)
+    args = parser.parse_args()
+    if args.command == "run" and args.days < 1:
+        parser.error("--days must be at least 1")
+
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        if args.command == "run":
+            print(archive_completed_results(db, older_than_days=args.days))
+        else:
+            partition_answers_table(db, months_ahead=args.months_ahead)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
+from sqlalchemy import and_, func, text, insert, or_, update
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from pydantic import ValidationError
 from . import models, schemas
+from .events import progress_bus
+from . import adaptive, archive, leaderboard, similarity
 from .security import get_password_hash
 from typing import List, Optional
 from fastapi import HTTPException
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
 import pandas as pd
+import os
 from datetime import datetime
 
 # User operations
@@ -34,6 +44,133 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+# Bulk user provisioning
+USER_IMPORT_BATCH_SIZE = 500
+# Ниже этого количества пароли хешируются в текущем процессе: запуск пула дороже самого хеширования
+PARALLEL_HASH_THRESHOLD = 32
+
+def _hash_password(password: str) -> str:
+    # Точка входа для дочерних процессов: app.crud импортируется без циклического импорта app.security
+    return get_password_hash(password)
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    workers = os.cpu_count() or 1
+    # На одном ядре пул ничего не ускоряет, а запуск воркеров через spawn стоит импорта приложения
+    if len(passwords) < PARALLEL_HASH_THRESHOLD or workers == 1:
+        return [get_password_hash(password) for password in passwords]
+    # Импорт идет из потока пула FastAPI в многопоточном процессе: fork может унаследовать чужие
+    # захваченные блокировки и зависнуть, поэтому воркеры запускаются через spawn
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return list(executor.map(_hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+def _read_users_file(file_path: str) -> pd.DataFrame:
+    if file_path.endswith(".csv"):
+        df = pd.read_csv(file_path, dtype=str)
+    else:
+        df = pd.read_excel(file_path, dtype=str)
+    df.columns = [str(column).strip().lower() for column in df.columns]
+    return df
+
+def _existing_logins(db: Session, emails: List[str], usernames: List[str]):
+    # Проверка конфликтов пачками IN-запросов вместо запроса на каждую строку
+    existing_emails, existing_usernames = set(), set()
+    for start in range(0, max(len(emails), len(usernames)), USER_IMPORT_BATCH_SIZE):
+        email_chunk = emails[start:start + USER_IMPORT_BATCH_SIZE]
+        username_chunk = usernames[start:start + USER_IMPORT_BATCH_SIZE]
+        rows = db.query(models.User.email, models.User.username).filter(
+            or_(models.User.email.in_(email_chunk), models.User.username.in_(username_chunk))
+        ).all()
+        for email, username in rows:
+            existing_emails.add(email)
+            existing_usernames.add(username)
+    return existing_emails, existing_usernames
+
+def import_users(db: Session, file_path: str):
+    try:
+        df = _read_users_file(file_path)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error reading users file: {str(e)}")
+    missing = {"email", "username", "full_name", "password"} - set(df.columns)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(sorted(missing))}")
+    df = df.where(pd.notna(df), None)
+
+    errors = []
+    candidates = []  # (номер строки, UserCreate)
+    seen_emails, seen_usernames = set(), set()
+    for index, row in enumerate(df.to_dict("records")):
+        row_number = index + 2  # строка 1 — заголовок
+        try:
+            user = schemas.UserCreate(
+                email=row["email"],
+                username=row["username"],
+                full_name=row["full_name"],
+                password=row["password"],
+                role=row.get("role") or "student"
+            )
+        except ValidationError as e:
+            errors.append({"row": row_number, "email": row["email"], "username": row["username"],
+                           "detail": "; ".join(error["msg"] for error in e.errors())})
+            continue
+        if user.email in seen_emails or user.username in seen_usernames:
+            errors.append({"row": row_number, "email": user.email, "username": user.username,
+                           "detail": "Duplicate email or username in file"})
+            continue
+        seen_emails.add(user.email)
+        seen_usernames.add(user.username)
+        candidates.append((row_number, user))
+
+    existing_emails, existing_usernames = _existing_logins(
+        db, [user.email for _, user in candidates], [user.username for _, user in candidates]
+    )
+    valid = []
+    for row_number, user in candidates:
+        if user.email in existing_emails:
+            errors.append({"row": row_number, "email": user.email, "username": user.username,
+                           "detail": "Email already registered"})
+        elif user.username in existing_usernames:
+            errors.append({"row": row_number, "email": user.email, "username": user.username,
+                           "detail": "Username already registered"})
+        else:
+            valid.append((row_number, user))
+
+    hashed = hash_passwords([user.password for _, user in valid])
+    rows = [
+        (row_number, {
+            "email": user.email,
+            "username": user.username,
+            "full_name": user.full_name,
+            "role": user.role,
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "created_at": datetime.utcnow(),
+        })
+        for (row_number, user), hashed_password in zip(valid, hashed)
+    ]
+
+    created = 0
+    for start in range(0, len(rows), USER_IMPORT_BATCH_SIZE):
+        batch = rows[start:start + USER_IMPORT_BATCH_SIZE]
+        try:
+            db.execute(insert(models.User), [values for _, values in batch])
+            db.commit()
+            created += len(batch)
+        except IntegrityError:
+            # Кто-то успел создать пользователя параллельно: вставляем пачку построчно, чтобы найти виновника
+            db.rollback()
+            for row_number, values in batch:
+                try:
+                    db.execute(insert(models.User), [values])
+                    db.commit()
+                    created += 1
+                except IntegrityError:
+                    db.rollback()
+                    errors.append({"row": row_number, "email": values["email"], "username": values["username"],
+                                   "detail": "Email or username already registered"})
+
+    errors.sort(key=lambda error: error["row"])
+    return {"created": created, "errors": errors}
+
 # Category operations
 def create_category(db: Session, category: schemas.CategoryCreate):
     db_category = models.Category(**category.dict())
@@ -77,14 +214,62 @@ def get_tests(db: Session, skip: int = 0, limit: int = 100, category_id: Optiona
         query = query.filter(models.Test.categories.any(id=category_id))
     return query.offset(skip).limit(limit).all()
 
+# Search operations
+_PG_SEARCH_SQL = text(f"""
+    SELECT 'test' AS kind, t.id, t.id AS test_id, t.title AS text, ts_rank(t.search_vector, q) AS rank
+    FROM tests t, websearch_to_tsquery('{models.SEARCH_CONFIG}', :q) q
+    WHERE t.search_vector @@ q
+    UNION ALL
+    SELECT 'question' AS kind, qu.id, qu.test_id, qu.question_text AS text, ts_rank(qu.search_vector, q) AS rank
+    FROM questions qu, websearch_to_tsquery('{models.SEARCH_CONFIG}', :q) q
+    WHERE qu.search_vector @@ q
+    ORDER BY rank DESC, kind DESC, id
+    LIMIT :limit OFFSET :skip
+""")
+
+# bm25 в FTS5 тем лучше, чем меньше, поэтому берем его со знаком минус
+_SQLITE_SEARCH_SQL = text("""
+    SELECT 'test' AS kind, tests.id, tests.id AS test_id, tests.title AS text, -bm25(tests_fts, 2.0, 1.0) AS rank
+    FROM tests_fts JOIN tests ON tests.id = tests_fts.rowid
+    WHERE tests_fts MATCH :q
+    UNION ALL
+    SELECT 'question' AS kind, questions.id, questions.test_id, questions.question_text AS text, -bm25(questions_fts) AS rank
+    FROM questions_fts JOIN questions ON questions.id = questions_fts.rowid
+    WHERE questions_fts MATCH :q
+    ORDER BY rank DESC, kind DESC, id
+    LIMIT :limit OFFSET :skip
+""")
+
+def _fts5_query(q: str) -> str:
+    # Каждое слово как отдельная фраза: пользовательский ввод не интерпретируется как синтаксис FTS5
+    return " ".join('"%s"' % word.replace('"', '""') for word in q.split())
+
+def search(db: Session, q: str, skip: int = 0, limit: int = 20):
+    if not q.strip():
+        return []
+    params = {"q": q, "skip": skip, "limit": limit}
+    if db.get_bind().dialect.name == "sqlite":
+        params["q"] = _fts5_query(q)
+        rows = db.execute(_SQLITE_SEARCH_SQL, params)
+    else:
+        rows = db.execute(_PG_SEARCH_SQL, params)
+    return [dict(row._mapping) for row in rows]
+
 # Question operations
 def create_question(db: Session, question: schemas.QuestionCreate):
     db_question = models.Question(**question.dict())
     db.add(db_question)
+    _bump_item_bank_version(db, db_question.test_id)
     db.commit()
     db.refresh(db_question)
     return db_question
 
+def _bump_item_bank_version(db: Session, test_id: int):
+    # Атомарный инкремент в той же транзакции, что и изменение вопросов (см. adaptive.get_item_bank)
+    db.query(models.Test).filter(models.Test.id == test_id).update(
+        {models.Test.item_bank_version: models.Test.item_bank_version + 1}, synchronize_session=False
+    )
+
 def get_questions_by_test(db: Session, test_id: int):
     return db.query(models.Question).filter(models.Question.test_id == test_id).all()
 
@@ -96,58 +281,262 @@ def create_test_result(db: Session, test_result: schemas.TestResultCreate):
     db.refresh(db_test_result)
     return db_test_result
 
-def get_test_results(db: Session, user_id: Optional[int] = None, test_id: Optional[int] = None):
+# Запас на сетевую задержку: ответ, отправленный в последнюю секунду, еще принимается
+TIME_LIMIT_GRACE_SECONDS = 10
+
+def _open_test_result(db: Session, test_id: int, user_id: int):
+    return db.query(models.TestResult).options(joinedload(models.TestResult.answers)).filter(
+        models.TestResult.test_id == test_id,
+        models.TestResult.user_id == user_id,
+        models.TestResult.completed_at.is_(None)
+    ).first()
+
+def start_test(db: Session, test_id: int, user_id: int):
+    test = get_test(db, test_id=test_id)
+    if test is None or not test.is_active:
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    # Продолжаем незавершенную попытку, если она есть
+    test_result = _open_test_result(db, test_id, user_id)
+    if test_result is None:
+        try:
+            test_result = create_test_result(db, schemas.TestResultCreate(test_id=test_id, user_id=user_id))
+        except IntegrityError:
+            # Параллельный запрос (двойной клик) уже открыл попытку — уникальный индекс
+            # uq_test_results_open_attempt не дал создать вторую, возвращаем ту
+            db.rollback()
+            test_result = _open_test_result(db, test_id, user_id)
+
+    time_left = _time_left(test, test_result)
+    if time_left == 0:
+        # Время вышло, пока студента не было: закрываем попытку и возвращаем ее завершенной,
+        # иначе после перезагрузки страницы ее можно было бы продолжать без ограничения
+        test_result = complete_test(db, test_result.id)
+
+    return {"test_result": test_result, "test": get_student_test(test), "time_left": time_left}
+
+def _time_left(test: models.Test, test_result: models.TestResult) -> Optional[int]:
+    if not test.time_limit:
+        return None
+    elapsed = (datetime.utcnow() - test_result.started_at).total_seconds()
+    return max(0, int(test.time_limit * 60 - elapsed))
+
+def get_student_test(test: models.Test) -> schemas.StudentTest:
+    student_test = schemas.StudentTest.model_validate(test)
+    # В адаптивном тесте вопросы выдаются по одному через next_adaptive_question
+    if test.is_adaptive:
+        student_test.questions = []
+    return student_test
+
+# Adaptive testing operations
+def _load_item_parameters(db: Session, test_id: int):
+    return db.query(
+        models.Question.id, models.Question.irt_discrimination, models.Question.irt_difficulty
+    ).filter(models.Question.test_id == test_id).order_by(models.Question.id).all()
+
+def next_adaptive_question(db: Session, test_result_id: int, user_id: int):
+    test_result = db.query(models.TestResult).options(joinedload(models.TestResult.test)).filter(
+        models.TestResult.id == test_result_id,
+        models.TestResult.user_id == user_id
+    ).first()
+    if not test_result:
+        raise HTTPException(status_code=404, detail="Test result not found")
+    test = test_result.test
+    if not test.is_adaptive:
+        raise HTTPException(status_code=400, detail="Test is not adaptive")
+
+    responses = db.query(models.Answer.question_id, models.Answer.is_correct).filter(
+        models.Answer.test_result_id == test_result_id
+    ).all()
+    bank = adaptive.get_item_bank(test.id, lambda: _load_item_parameters(db, test.id), version=test.item_bank_version)
+    ability, standard_error = bank.estimate(responses)
+
+    answered_ids = {question_id for question_id, _ in responses}
+    max_items = test.adaptive_max_items or len(bank.question_ids)
+    question_id = None
+    if test_result.completed_at is None and len(answered_ids) < max_items and \
+            not (answered_ids and standard_error < adaptive.TARGET_STANDARD_ERROR):
+        question_id = bank.select(ability, answered_ids)
+
+    question = db.query(models.Question).filter(models.Question.id == question_id).first() if question_id else None
+    if test_result.served_question_id != question_id:
+        test_result.served_question_id = question_id
+        db.commit()
+    return {
+        "question": question,
+        "finished": question is None,
+        "answered": len(answered_ids),
+        "ability": ability,
+        "standard_error": standard_error,
+    }
+
+def calibrate_test(db: Session, test_id: int, model: str = "2pl"):
+    rows = db.query(models.Answer.question_id, models.Answer.test_result_id, models.Answer.is_correct).join(
+        models.Question, models.Question.id == models.Answer.question_id
+    ).filter(models.Question.test_id == test_id, models.Answer.is_correct.isnot(None)).all()
+    parameters = adaptive.calibrate(
+        np.array([row[0] for row in rows], dtype=np.int64),
+        np.array([row[1] for row in rows], dtype=np.int64),
+        np.array([row[2] for row in rows], dtype=bool),
+        model=model
+    )
+    db.bulk_update_mappings(models.Question, [
+        {"id": question_id, "irt_discrimination": a, "irt_difficulty": b}
+        for question_id, (a, b) in parameters.items()
+    ])
+    _bump_item_bank_version(db, test_id)
+    db.commit()
+    total = db.query(func.count(models.Question.id)).filter(models.Question.test_id == test_id).scalar()
+    return {"calibrated": len(parameters), "total": total}
+
+def get_test_result(db: Session, test_result_id: int):
+    return db.query(models.TestResult).filter(models.TestResult.id == test_result_id).first()
+
+def get_test_results(db: Session, user_id: Optional[int] = None, test_id: Optional[int] = None,
+                     include_archived: bool = False):
     query = db.query(models.TestResult)
     if user_id:
         query = query.filter(models.TestResult.user_id == user_id)
     if test_id:
         query = query.filter(models.TestResult.test_id == test_id)
-    return query.all()
+    results = query.all()
+    if include_archived:
+        results = archive.read_archived_results(test_id=test_id, user_id=user_id) + results
+    return results
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+def _options_from_indexes(question: models.Question, answer_content):
+    # Студенческий клиент присылает индексы вариантов (см. schemas.StudentQuestion); храним текст вариантов
+    indexes = _as_list(answer_content)
+    if not question.options or not all(isinstance(i, int) and not isinstance(i, bool) for i in indexes):
+        return answer_content
+    options = schemas.compact_options(question.options)
+    if any(i < 0 or i >= len(options) for i in indexes):
+        raise HTTPException(status_code=400, detail="Invalid option index")
+    return [options[i] for i in indexes]
 
 def submit_answer(db: Session, answer: schemas.AnswerCreate):
     # Get the question to check the answer
     question = db.query(models.Question).filter(models.Question.id == answer.question_id).first()
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
+    test_result = db.query(models.TestResult).options(joinedload(models.TestResult.test)).filter(
+        models.TestResult.id == answer.test_result_id
+    ).first()
+    if not test_result:
+        raise HTTPException(status_code=404, detail="Test result not found")
+    if test_result.completed_at is not None:
+        # Иначе upsert переписал бы ответы уже проверенной попытки, и повторный complete поднял бы балл
+        raise HTTPException(status_code=409, detail="Test result is already completed")
+    if question.test_id != test_result.test_id:
+        raise HTTPException(status_code=400, detail="Question does not belong to this test")
+    if test_result.test.time_limit and (datetime.utcnow() - test_result.started_at).total_seconds() > \
+            test_result.test.time_limit * 60 + TIME_LIMIT_GRACE_SECONDS:
+        raise HTTPException(status_code=409, detail="Time limit exceeded")
+    # В адаптивном тесте принимается ответ только на вопрос, выданный next_adaptive_question
+    if test_result.test.is_adaptive and question.id != test_result.served_question_id:
+        raise HTTPException(status_code=400, detail="Question was not served in this attempt")
     
     # Check if the answer is correct
     is_correct = False
     points_earned = 0
     
     if question.question_type == "multiple_choice":
-        is_correct = set(answer.answer_content) == set(question.correct_answer)
+        answer.answer_content = _options_from_indexes(question, answer.answer_content)
+        is_correct = set(_as_list(answer.answer_content)) == set(_as_list(question.correct_answer))
     else:  # Для других типов вопросов можно добавить свою логику проверки
         is_correct = answer.answer_content == question.correct_answer
     
     if is_correct:
         points_earned = question.points
     
-    # Create the answer record
-    db_answer = models.Answer(
-        test_result_id=answer.test_result_id,
-        question_id=answer.question_id,
-        answer_content=answer.answer_content,
-        is_correct=is_correct,
-        points_earned=points_earned
-    )
-    
-    db.add(db_answer)
+    # Один ответ на вопрос: INSERT ... ON CONFLICT DO UPDATE. Повтор с тем же ключом идемпотентности
+    # не попадает под условие WHERE, ничего не меняет, и возвращается уже сохраненная строка.
+    values = {
+        "test_result_id": answer.test_result_id,
+        "question_id": answer.question_id,
+        "answer_content": answer.answer_content,
+        "is_correct": is_correct,
+        "points_earned": points_earned,
+        "created_at": test_result.started_at,
+        "idempotency_key": answer.idempotency_key,
+    }
+    try:
+        answer_id = db.execute(_answer_upsert(db, values, _answer_conflict_columns(db))).scalar()
+    except ProgrammingError:
+        # Таблицу секционировали (или вернули обратно), пока процесс работал: закешированный ключ
+        # ON CONFLICT больше не совпадает с уникальным ограничением. Определяем его заново и повторяем.
+        db.rollback()
+        columns = _answer_conflict_columns(db, refresh=True)
+        answer_id = db.execute(_answer_upsert(db, values, columns)).scalar()
     db.commit()
-    db.refresh(db_answer)
+    if answer_id is None:
+        # Повтор уже примененной отправки
+        db_answer = db.query(models.Answer).filter(
+            models.Answer.test_result_id == answer.test_result_id,
+            models.Answer.question_id == answer.question_id
+        ).one()
+        return db_answer
+    db_answer = db.get(models.Answer, answer_id, populate_existing=True)
+
+    if progress_bus.has_subscribers(question.test_id):
+        publish_progress(db, test_result)
     return db_answer
 
+def _answer_upsert(db: Session, values: dict, conflict_columns: List[str]):
+    dialect_insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+    statement = dialect_insert(models.Answer).values(**values)
+    return statement.on_conflict_do_update(
+        index_elements=conflict_columns,
+        set_={
+            "answer_content": statement.excluded.answer_content,
+            "is_correct": statement.excluded.is_correct,
+            "points_earned": statement.excluded.points_earned,
+            "idempotency_key": statement.excluded.idempotency_key,
+        },
+        where=or_(
+            statement.excluded.idempotency_key.is_(None),
+            models.Answer.idempotency_key.is_distinct_from(statement.excluded.idempotency_key)
+        )
+    ).returning(models.Answer.id)
+
+_answer_conflict_target = None
+
+def _answer_conflict_columns(db: Session, refresh: bool = False):
+    # В секционированной таблице (archive.partition_answers_table) уникальный ключ обязан включать
+    # created_at; так как created_at — начало попытки, это тот же ключ (попытка, вопрос).
+    # Результат проверки кешируется; refresh=True перепроверяет каталог (см. submit_answer)
+    global _answer_conflict_target
+    if _answer_conflict_target is None or refresh:
+        partitioned = db.get_bind().dialect.name == "postgresql" and db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = 'answers')"
+        )).scalar()
+        _answer_conflict_target = ["test_result_id", "question_id"] + (["created_at"] if partitioned else [])
+    return _answer_conflict_target
+
 def complete_test(db: Session, test_result_id: int):
     test_result = db.query(models.TestResult).filter(models.TestResult.id == test_result_id).first()
     if not test_result:
         raise HTTPException(status_code=404, detail="Test result not found")
+    if test_result.completed_at is not None:
+        raise HTTPException(status_code=409, detail="Test result is already completed")
     
     # Calculate total score
     answers = db.query(models.Answer).filter(models.Answer.test_result_id == test_result_id).all()
     score = sum(answer.points_earned for answer in answers)
     
     # Calculate max possible score
-    questions = db.query(models.Question).filter(models.Question.test_id == test_result.test_id).all()
-    max_score = sum(question.points for question in questions)
+    if test_result.test.is_adaptive:
+        # В адаптивном тесте максимум считается только по заданным вопросам, а не по всему банку
+        max_score = db.query(func.coalesce(func.sum(models.Question.points), 0)).join(
+            models.Answer, models.Answer.question_id == models.Question.id
+        ).filter(models.Answer.test_result_id == test_result_id).scalar()
+    else:
+        questions = db.query(models.Question).filter(models.Question.test_id == test_result.test_id).all()
+        max_score = sum(question.points for question in questions)
     
     # Update test result
     test_result.score = score
@@ -156,8 +545,161 @@ def complete_test(db: Session, test_result_id: int):
     
     db.commit()
     db.refresh(test_result)
+
+    if progress_bus.has_subscribers(test_result.test_id):
+        progress_bus.publish(
+            test_result.test_id, test_result.id, test_result.user_id,
+            answered=len(answers), score=score, completed=True
+        )
+    record_leaderboard_result(db, test_result)
     return test_result
 
+# Leaderboard operations
+def record_leaderboard_result(db: Session, test_result: models.TestResult):
+    # INSERT ... ON CONFLICT DO UPDATE: два параллельных завершения (двойной клик) не упираются в первичный
+    # ключ, а условие WHERE оставляет лучший результат; RETURNING пуст, если рекорд не улучшился
+    dialect_insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+    statement = dialect_insert(models.LeaderboardEntry).values(
+        test_id=test_result.test_id,
+        user_id=test_result.user_id,
+        best_score=test_result.score,
+        test_result_id=test_result.id,
+        achieved_at=test_result.completed_at,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["test_id", "user_id"],
+        set_={
+            "best_score": statement.excluded.best_score,
+            "test_result_id": statement.excluded.test_result_id,
+            "achieved_at": statement.excluded.achieved_at,
+        },
+        where=models.LeaderboardEntry.best_score < statement.excluded.best_score
+    ).returning(models.LeaderboardEntry.user_id)
+    if db.execute(statement).scalar() is None:
+        db.commit()
+        return
+    version = db.execute(
+        update(models.Test).where(models.Test.id == test_result.test_id)
+        .values(leaderboard_version=models.Test.leaderboard_version + 1)
+        .returning(models.Test.leaderboard_version)
+    ).scalar()
+    db.commit()
+
+    # Лидерборд в памяти обновляется инкрементально, только если он уже загружен и до этой записи
+    # был актуален; иначе следующее чтение перезагрузит его по новой версии
+    board = leaderboard.loaded_board(test_result.test_id)
+    if board is not None:
+        with board.lock:
+            if board.version == version - 1:
+                board.submit(test_result.user_id, test_result.score)
+                board.version = version
+
+def _get_board(db: Session, test_id: int) -> leaderboard.Leaderboard:
+    # Версия читается по первичному ключу tests, так что проверка свежести стоит O(1)
+    version = db.query(models.Test.leaderboard_version).filter(models.Test.id == test_id).scalar() or 0
+    return leaderboard.get_board(test_id, lambda: db.query(
+        models.LeaderboardEntry.user_id, models.LeaderboardEntry.best_score
+    ).filter(models.LeaderboardEntry.test_id == test_id).all(), version=version)
+
+def get_leaderboard(db: Session, test_id: int, limit: int = 10):
+    board = _get_board(db, test_id)
+    with board.lock:
+        top = board.top(limit)
+    usernames = dict(db.query(models.User.id, models.User.username).filter(
+        models.User.id.in_([user_id for _, user_id, _ in top])
+    ).all()) if top else {}
+    return [
+        {"rank": rank, "user_id": user_id, "username": usernames.get(user_id), "score": score}
+        for rank, user_id, score in top
+    ]
+
+def get_leaderboard_position(db: Session, test_id: int, user_id: int, score: Optional[int] = None):
+    board = _get_board(db, test_id)
+    with board.lock:
+        if score is None:
+            score = board.best(user_id)
+            if score is None:
+                raise HTTPException(status_code=404, detail="No completed result for this test")
+        return board.position(score)
+
+# Progress operations
+def _progress_query(db: Session):
+    return db.query(
+        models.TestResult.id,
+        models.TestResult.user_id,
+        models.TestResult.completed_at,
+        func.count(models.Answer.id),
+        func.coalesce(func.sum(models.Answer.points_earned), 0)
+    ).outerjoin(models.Answer, models.Answer.test_result_id == models.TestResult.id).group_by(models.TestResult.id)
+
+def get_test_progress(db: Session, test_id: int):
+    rows = _progress_query(db).filter(models.TestResult.test_id == test_id).all()
+    return [
+        {
+            "test_result_id": result_id,
+            "user_id": user_id,
+            "answered": answered,
+            "score": score,
+            "completed": completed_at is not None,
+        }
+        for result_id, user_id, completed_at, answered, score in rows
+    ]
+
+def publish_progress(db: Session, test_result: models.TestResult):
+    _, user_id, completed_at, answered, score = _progress_query(db).filter(
+        models.TestResult.id == test_result.id
+    ).one()
+    progress_bus.publish(
+        test_result.test_id, test_result.id, user_id,
+        answered=answered, score=score, completed=completed_at is not None
+    )
+
+# Similarity operations
+def find_similar_answers(db: Session, test_id: int, threshold: float = similarity.DEFAULT_THRESHOLD):
+    rows = db.query(
+        models.Answer.id,
+        models.Answer.question_id,
+        models.Answer.test_result_id,
+        models.TestResult.user_id,
+        models.Answer.answer_content
+    ).join(models.Question, models.Question.id == models.Answer.question_id).join(
+        models.TestResult, models.TestResult.id == models.Answer.test_result_id
+    ).filter(
+        models.Question.test_id == test_id,
+        models.Question.question_type == "open_ended"
+    ).order_by(models.Answer.id).all()
+
+    # Последний ответ каждой попытки на каждый вопрос, сгруппированный по вопросам
+    latest = {}
+    for row in rows:
+        if isinstance(row.answer_content, str):
+            latest[(row.question_id, row.test_result_id)] = row
+    by_question = {}
+    for row in latest.values():
+        by_question.setdefault(row.question_id, []).append(row)
+
+    clusters = []
+    for question_id, answers in by_question.items():
+        for members in similarity.find_clusters([answer.answer_content for answer in answers], threshold):
+            cluster = [answers[i] for i in members]
+            # Совпадения ответов одного и того же студента не интересны
+            if len({answer.user_id for answer in cluster}) < 2:
+                continue
+            clusters.append({
+                "question_id": question_id,
+                "answers": [
+                    {
+                        "answer_id": answer.id,
+                        "test_result_id": answer.test_result_id,
+                        "user_id": answer.user_id,
+                        "answer_content": answer.answer_content,
+                    }
+                    for answer in cluster
+                ],
+            })
+    clusters.sort(key=lambda cluster: (cluster["question_id"], -len(cluster["answers"])))
+    return clusters
+
 def import_test_from_excel(db: Session, file_path: str, creator_id: int, category_ids: List[int]):
     try:
         # Чтение Excel файла
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+# Как часто подписчик получает накопленные изменения (секунды).
+# Между отправками изменения по одной попытке схлопываются до последнего состояния,
+# поэтому поток сообщений ограничен 1/PROGRESS_FLUSH_INTERVAL в секунду при любом числе студентов.
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "1"))
+# Пустой комментарий, чтобы прокси не закрывали простаивающее соединение
+PROGRESS_KEEPALIVE_INTERVAL = 15.0
+
+
+class ProgressSubscription:
+    def __init__(self, test_id: int):
+        self.test_id = test_id
+        # test_result_id -> последнее состояние попытки
+        self._pending: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+
+    def push(self, delta: dict):
+        with self._lock:
+            self._pending[delta["test_result_id"]] = delta
+
+    def drain(self) -> list:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return list(pending.values())
+
+
+class ProgressBus:
+    """Внутрипроцессная шина прогресса студентов по тестам.
+
+    publish вызывается из синхронных CRUD-функций (пул потоков FastAPI),
+    подписки читаются из event loop, поэтому доступ защищен блокировками.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[int, set] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, test_id: int) -> ProgressSubscription:
+        subscription = ProgressSubscription(test_id)
+        with self._lock:
+            self._subscriptions.setdefault(test_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ProgressSubscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.test_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.test_id]
+
+    def has_subscribers(self, test_id: int) -> bool:
+        return test_id in self._subscriptions
+
+    def publish(self, test_id: int, test_result_id: int, user_id: Optional[int],
+                answered: int, score: int, completed: bool):
+        delta = {
+            "test_result_id": test_result_id,
+            "user_id": user_id,
+            "answered": answered,
+            "score": score,
+            "completed": completed,
+        }
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(test_id, ()))
+        for subscription in subscriptions:
+            subscription.push(delta)
+
+
+progress_bus = ProgressBus()
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def stream_progress(subscription: ProgressSubscription, snapshot: list, is_disconnected):
+    """Генератор SSE: сначала снимок текущего состояния, затем схлопнутые изменения."""
+    try:
+        yield format_sse("snapshot", snapshot)
+        idle = 0.0
+        while not await is_disconnected():
+            await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+            deltas = subscription.drain()
+            if deltas:
+                idle = 0.0
+                yield format_sse("progress", deltas)
+            else:
+                idle += PROGRESS_FLUSH_INTERVAL
+                if idle >= PROGRESS_KEEPALIVE_INTERVAL:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+    finally:
+        progress_bus.unsubscribe(subscription)
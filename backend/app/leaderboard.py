@@ -0,0 +1,137 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Лидерборды тестов в памяти процесса. Учитывается лучший результат каждого пользователя.
+# Счетчики по значениям баллов хранятся в дереве Фенвика, поэтому место и процентиль для
+# произвольного балла считаются за O(log S), где S — максимальный балл, а top N — за O(log S + N).
+# Источник истины — таблица leaderboard_entries. Каждое ее изменение увеличивает tests.leaderboard_version
+# в той же транзакции; лидерборд в памяти помнит версию, по которой построен, и перезагружается,
+# если при чтении версия в базе другая (результат записан другим процессом, таблица перестроена).
+
+
+class Leaderboard:
+    def __init__(self, entries: List[Tuple[int, int]] = ()):
+        self._best: Dict[int, int] = {}  # user_id -> лучший балл
+        self._by_score: Dict[int, set] = {}  # балл -> user_id с этим лучшим баллом
+        self.version = 0  # tests.leaderboard_version, которой соответствует содержимое
+        self._size = 64
+        self._tree = [0] * (self._size + 1)
+        self.lock = threading.Lock()
+        for user_id, score in entries:
+            self.submit(user_id, score)
+
+    def __len__(self):
+        return len(self._best)
+
+    def _grow(self, score: int):
+        size = self._size
+        while score >= size:
+            size *= 2
+        if size == self._size:
+            return
+        counts = [0] * size
+        for value, users in self._by_score.items():
+            counts[value] = len(users)
+        self._size = size
+        self._tree = [0] * (size + 1)
+        # Построение дерева за O(S)
+        for i, count in enumerate(counts, start=1):
+            self._tree[i] += count
+            parent = i + (i & -i)
+            if parent <= size:
+                self._tree[parent] += self._tree[i]
+
+    def _add(self, score: int, delta: int):
+        i = score + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_below(self, score: int) -> int:
+        # Количество пользователей с лучшим баллом строго меньше score
+        i = min(max(score, 0), self._size)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def submit(self, user_id: int, score: int) -> bool:
+        """Учитывает результат; возвращает True, если это новый лучший результат пользователя."""
+        score = max(score, 0)
+        previous = self._best.get(user_id)
+        if previous is not None and previous >= score:
+            return False
+        self._grow(score)
+        if previous is not None:
+            self._add(previous, -1)
+            self._by_score[previous].discard(user_id)
+            if not self._by_score[previous]:
+                del self._by_score[previous]
+        self._add(score, 1)
+        self._by_score.setdefault(score, set()).add(user_id)
+        self._best[user_id] = score
+        return True
+
+    def best(self, user_id: int) -> Optional[int]:
+        return self._best.get(user_id)
+
+    def position(self, score: int) -> dict:
+        total = len(self._best)
+        below = self._count_below(score)
+        above = total - self._count_below(score + 1)
+        return {
+            "score": score,
+            "rank": above + 1,
+            "total": total,
+            "percentile": round(100.0 * below / total, 1) if total else 0.0,
+        }
+
+    def _kth_smallest(self, k: int) -> int:
+        # Балл k-го (с 1) пользователя по возрастанию — спуск по дереву Фенвика
+        position = 0
+        step = 1 << self._size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self._size and self._tree[nxt] < k:
+                position = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return position
+
+    def top(self, limit: int) -> List[Tuple[int, int, int]]:
+        """Первые limit мест: [(место, user_id, балл)]; при равенстве баллов место общее."""
+        total = len(self._best)
+        result = []
+        k = total
+        # Идем от лучшего балла вниз: k-й по возрастанию — последний в своей группе равных баллов
+        while k > 0 and len(result) < limit:
+            score = self._kth_smallest(k)
+            users = self._by_score[score]
+            rank = total - k + 1
+            for user_id in sorted(users):
+                result.append((rank, user_id, score))
+            k -= len(users)
+        return result[:limit]
+
+
+_boards: Dict[int, Leaderboard] = {}
+_lock = threading.Lock()
+
+
+def get_board(test_id: int, load_entries, version: int = 0) -> Leaderboard:
+    """Лидерборд теста из памяти; загружается через load_entries() при первом обращении
+    и когда version (tests.leaderboard_version) не совпадает с версией загруженного."""
+    board = _boards.get(test_id)
+    if board is None or board.version != version:
+        with _lock:
+            board = _boards.get(test_id)
+            if board is None or board.version != version:
+                board = Leaderboard(load_entries())
+                board.version = version
+                _boards[test_id] = board
+    return board
+
+
+def loaded_board(test_id: int) -> Optional[Leaderboard]:
+    return _boards.get(test_id)
@@ -1,14 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request, Header
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from brotli_asgi import BrotliMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import timedelta
 import os
 import tempfile
 
-from . import crud, models, schemas, security
-from .database import SessionLocal, engine, Base
+from . import archive, crud, models, schemas, security
+from .events import progress_bus, stream_progress
+from .database import engine, Base, get_db, get_read_db, route_read_session
 
 # Создаем таблицы в базе данных
 Base.metadata.create_all(bind=engine)
@@ -24,9 +29,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие ответов: brotli, если клиент его поддерживает, иначе gzip. Мелкие ответы не сжимаем,
+# SSE-поток исключен, чтобы события не застревали в буфере компрессора.
+app.add_middleware(
+    BrotliMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    gzip_fallback=True,
+    excluded_handlers=[r"^/tests/\d+/progress/stream$"],
+)
+
 # Dependency
-def get_db():
-    db = SessionLocal()
+# Для записи используется database.get_db: это та же зависимость, что и в security, поэтому
+# эндпоинт получает сессию, в которой аутентифицирован пользователь, и ее коммиты отмечаются как его записи.
+# Read-only эндпоинты читают с реплики, кроме пользователей, которые только что что-то записали.
+def get_user_read_db(current_user = Depends(security.get_current_active_user)):
+    db = route_read_session(current_user.id)
     try:
         yield db
     finally:
@@ -59,6 +76,28 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Email already registered")
     return crud.create_user(db=db, user=user)
 
+@app.post("/users/import/", response_model=schemas.UserImportResult)
+async def import_users(
+    file: UploadFile = File(...),
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    # Сохраняем файл во временную директорию, сохраняя расширение (csv/xlsx)
+    suffix = ".csv" if (file.filename or "").lower().endswith(".csv") else ".xlsx"
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    try:
+        contents = await file.read()
+        with open(temp_file.name, 'wb') as f:
+            f.write(contents)
+
+        # Хеширование тысяч паролей занимает секунды — не блокируем event loop
+        return await run_in_threadpool(crud.import_users, db=db, file_path=temp_file.name)
+    finally:
+        os.unlink(temp_file.name)  # Удаляем временный файл
+
 @app.get("/users/me/", response_model=schemas.User)
 async def read_users_me(
     current_user = Depends(security.get_current_active_user)
@@ -70,7 +109,7 @@ def read_users(
     skip: int = 0,
     limit: int = 100,
     current_user = Depends(security.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_read_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
@@ -92,7 +131,7 @@ def create_category(
 def read_categories(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     categories = crud.get_categories(db, skip=skip, limit=limit)
     return categories
@@ -108,27 +147,49 @@ def create_test(
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return crud.create_test(db=db, test=test, creator_id=current_user.id)
 
-@app.get("/tests/", response_model=List[schemas.Test])
+@app.get("/tests/", response_model=List[Union[schemas.Test, schemas.StudentTest]])
 def read_tests(
     skip: int = 0,
     limit: int = 100,
     category_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_read_db),
     current_user = Depends(security.get_current_active_user)
 ):
     tests = crud.get_tests(db, skip=skip, limit=limit, category_id=category_id)
-    return tests
+    # Студенты получают тесты без правильных ответов (и без банка адаптивных тестов)
+    if current_user.role not in ["admin", "teacher"]:
+        return [crud.get_student_test(test) for test in tests]
+    return [schemas.Test.model_validate(test) for test in tests]
 
-@app.get("/tests/{test_id}", response_model=schemas.Test)
+@app.get(
+    "/tests/{test_id}",
+    response_model=Union[schemas.Test, schemas.StudentTest],
+    response_model_exclude_none=True
+)
 def read_test(
     test_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_read_db),
     current_user = Depends(security.get_current_active_user)
 ):
     test = crud.get_test(db, test_id=test_id)
     if test is None:
         raise HTTPException(status_code=404, detail="Test not found")
-    return test
+    # Студенты получают тест без правильных ответов
+    if current_user.role not in ["admin", "teacher"]:
+        return crud.get_student_test(test)
+    return schemas.Test.model_validate(test)
+
+@app.get("/search/", response_model=List[schemas.SearchHit])
+def search(
+    q: str,
+    skip: int = 0,
+    limit: int = 20,
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_user_read_db)
+):
+    if current_user.role not in ["admin", "teacher"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return crud.search(db, q=q, skip=skip, limit=min(limit, 100))
 
 # Question endpoints
 @app.post("/questions/", response_model=schemas.Question)
@@ -141,14 +202,21 @@ def create_question(
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return crud.create_question(db=db, question=question)
 
-@app.get("/tests/{test_id}/questions/", response_model=List[schemas.Question])
+@app.get("/tests/{test_id}/questions/", response_model=List[Union[schemas.Question, schemas.StudentQuestion]])
 def read_test_questions(
     test_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_read_db),
     current_user = Depends(security.get_current_active_user)
 ):
+    if current_user.role not in ["admin", "teacher"]:
+        # Банк адаптивного теста студенту не показываем: вопросы выдаются по одному через next-question
+        test = crud.get_test(db, test_id=test_id)
+        if test is None or test.is_adaptive:
+            return []
+        questions = crud.get_questions_by_test(db, test_id=test_id)
+        return [schemas.StudentQuestion.model_validate(question) for question in questions]
     questions = crud.get_questions_by_test(db, test_id=test_id)
-    return questions
+    return [schemas.Question.model_validate(question) for question in questions]
 
 # Test results endpoints
 @app.post("/test-results/", response_model=schemas.TestResult)
@@ -157,18 +225,56 @@ def create_test_result(
     current_user = Depends(security.get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    return crud.create_test_result(db=db, test_result=test_result)
+    try:
+        return crud.create_test_result(db=db, test_result=test_result)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Unfinished attempt for this test already exists")
+
+@app.post("/tests/{test_id}/start/", response_model=schemas.TestAttempt)
+def start_test(
+    test_id: int,
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # Создает попытку (или возвращает открытую) и сразу отдает тест без ответов — один запрос вместо трех
+    return crud.start_test(db=db, test_id=test_id, user_id=current_user.id)
 
-@app.post("/test-results/{test_result_id}/submit-answer/", response_model=schemas.Answer)
+@app.post("/test-results/{test_result_id}/next-question/", response_model=schemas.AdaptiveStep)
+def next_adaptive_question(
+    test_result_id: int,
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    return crud.next_adaptive_question(db=db, test_result_id=test_result_id, user_id=current_user.id)
+
+@app.post("/tests/{test_id}/calibrate/", response_model=schemas.CalibrationResult)
+def calibrate_test(
+    test_id: int,
+    model: str = "2pl",
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role not in ["admin", "teacher"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if model not in ["2pl", "rasch"]:
+        raise HTTPException(status_code=400, detail="Model must be '2pl' or 'rasch'")
+    return crud.calibrate_test(db=db, test_id=test_id, model=model)
+
+@app.post("/test-results/{test_result_id}/submit-answer/", response_model=schemas.StudentAnswer)
 def submit_test_answer(
     test_result_id: int,
     answer: schemas.AnswerCreate,
+    idempotency_key: Optional[str] = Header(None),
     current_user = Depends(security.get_current_active_user),
     db: Session = Depends(get_db)
 ):
+    # Ключ идемпотентности можно передать в заголовке Idempotency-Key или в теле запроса
+    if answer.idempotency_key is None:
+        answer.idempotency_key = idempotency_key
     # Проверяем, принадлежит ли test_result текущему пользователю
-    test_result = crud.get_test_results(db, user_id=current_user.id, test_id=answer.test_result_id)
-    if not test_result:
+    test_result = crud.get_test_result(db, test_result_id=test_result_id)
+    if not test_result or test_result.user_id != current_user.id or answer.test_result_id != test_result_id:
         raise HTTPException(status_code=403, detail="Not authorized to submit answer for this test")
     return crud.submit_answer(db=db, answer=answer)
 
@@ -178,20 +284,122 @@ def complete_test_result(
     current_user = Depends(security.get_current_active_user),
     db: Session = Depends(get_db)
 ):
+    # Завершить попытку может только ее владелец
+    test_result = crud.get_test_result(db, test_result_id=test_result_id)
+    if not test_result or test_result.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to complete this test")
     return crud.complete_test(db=db, test_result_id=test_result_id)
 
-@app.get("/test-results/", response_model=List[schemas.TestResult])
+@app.get("/test-results/", response_model=List[Union[schemas.TestResult, schemas.StudentTestResult]])
 def read_test_results(
     test_id: Optional[int] = None,
     user_id: Optional[int] = None,
+    include_archived: bool = False,
     current_user = Depends(security.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_read_db)
 ):
     # Проверяем права доступа
     if current_user.role not in ["admin", "teacher"]:
         # Студенты могут видеть только свои результаты
         user_id = current_user.id
-    return crud.get_test_results(db, user_id=user_id, test_id=test_id)
+    test_results = crud.get_test_results(db, user_id=user_id, test_id=test_id, include_archived=include_archived)
+    if current_user.role not in ["admin", "teacher"]:
+        # Проверку ответов студент видит только после завершения попытки
+        # (архивные попытки приходят словарями и всегда завершены)
+        return [
+            schemas.StudentTestResult.model_validate(test_result)
+            if not isinstance(test_result, dict) and test_result.completed_at is None else test_result
+            for test_result in test_results
+        ]
+    return test_results
+
+@app.get("/test-results/{test_result_id}", response_model=Union[schemas.TestResult, schemas.StudentTestResult])
+def read_test_result(
+    test_result_id: int,
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_user_read_db)
+):
+    test_result = crud.get_test_result(db, test_result_id=test_result_id)
+    if test_result is None:
+        raise HTTPException(status_code=404, detail="Test result not found")
+    if current_user.role not in ["admin", "teacher"]:
+        if test_result.user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to view this result")
+        if test_result.completed_at is None:
+            return schemas.StudentTestResult.model_validate(test_result)
+    return test_result
+
+@app.get("/tests/{test_id}/leaderboard/", response_model=List[schemas.LeaderboardRow])
+def read_leaderboard(
+    test_id: int,
+    limit: int = 10,
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    return crud.get_leaderboard(db, test_id=test_id, limit=min(limit, 100))
+
+@app.get("/tests/{test_id}/leaderboard/position/", response_model=schemas.LeaderboardPosition)
+def read_leaderboard_position(
+    test_id: int,
+    score: Optional[int] = None,
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # Без score — позиция лучшего результата текущего пользователя
+    return crud.get_leaderboard_position(db, test_id=test_id, user_id=current_user.id, score=score)
+
+@app.post("/admin/archive/", response_model=schemas.ArchiveResult)
+def archive_test_results(
+    older_than_days: int = archive.ARCHIVE_RETENTION_DAYS,
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    # При 0 и меньше в архив ушли бы и только что завершенные попытки
+    if older_than_days < 1:
+        raise HTTPException(status_code=400, detail="older_than_days must be at least 1")
+    return archive.archive_completed_results(db, older_than_days=older_than_days)
+
+@app.get("/tests/{test_id}/progress/stream")
+def stream_test_progress(
+    test_id: int,
+    request: Request,
+    current_user = Depends(security.get_current_active_user),
+    auth_db: Session = Depends(get_db),
+    db: Session = Depends(get_user_read_db)
+):
+    if current_user.role not in ["admin", "teacher"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    # Подписываемся до снимка, чтобы не потерять изменения между запросом и подпиской
+    subscription = progress_bus.subscribe(test_id)
+    try:
+        snapshot = crud.get_test_progress(db, test_id=test_id)
+    except Exception:
+        progress_bus.unsubscribe(subscription)
+        raise
+    finally:
+        # Сессии зависимостей закрываются только после ответа — не держим соединения на время стрима
+        db.close()
+        auth_db.close()
+    return StreamingResponse(
+        stream_progress(subscription, snapshot, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/tests/{test_id}/similar-answers/", response_model=List[schemas.SimilarityCluster])
+def read_similar_answers(
+    test_id: int,
+    threshold: float = 0.8,
+    current_user = Depends(security.get_current_active_user),
+    db: Session = Depends(get_user_read_db)
+):
+    if current_user.role not in ["admin", "teacher"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if not 0 < threshold <= 1:
+        raise HTTPException(status_code=400, detail="Threshold must be in (0, 1]")
+    return crud.find_similar_answers(db, test_id=test_id, threshold=threshold)
 
 # Excel import endpoint
 @app.post("/tests/import-excel/", response_model=schemas.Test)
@@ -1,8 +1,12 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, JSON, Table
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, JSON, Table, DDL, Float, Index, UniqueConstraint, event, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from .database import Base
 import datetime
 
+# JSONB в PostgreSQL, обычный JSON в остальных базах (SQLite для локальной разработки)
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 # Связующая таблица для отношения многие-ко-многим между тестами и категориями
 test_categories = Table('test_categories', Base.metadata,
     Column('test_id', Integer, ForeignKey('tests.id')),
@@ -44,6 +48,12 @@ class Test(Base):
     creator_id = Column(Integer, ForeignKey("users.id"))
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    is_adaptive = Column(Boolean, default=False)  # вопросы подбираются по IRT (см. adaptive.py)
+    adaptive_max_items = Column(Integer)  # максимум вопросов в адаптивной попытке
+    # Растет при каждом изменении вопросов или их параметров; по нему процессы сверяют кеш банка вопросов
+    item_bank_version = Column(Integer, default=0, server_default="0", nullable=False)
+    # Растет при каждом изменении leaderboard_entries теста (см. leaderboard.py)
+    leaderboard_version = Column(Integer, default=0, server_default="0", nullable=False)
 
     # Отношения
     creator = relationship("User", back_populates="created_tests")
@@ -58,9 +68,12 @@ class Question(Base):
     test_id = Column(Integer, ForeignKey("tests.id"))
     question_text = Column(Text)
     question_type = Column(String)  # multiple_choice, open_ended, etc.
-    options = Column(JSON)  # для вопросов с вариантами ответов
-    correct_answer = Column(JSON)  # может содержать один или несколько правильных ответов
+    options = Column(JSONType)  # для вопросов с вариантами ответов
+    correct_answer = Column(JSONType)  # может содержать один или несколько правильных ответов
     points = Column(Integer, default=1)
+    # Параметры IRT, откалиброванные по историческим ответам (None — параметры по умолчанию)
+    irt_discrimination = Column(Float)
+    irt_difficulty = Column(Float)
 
     # Отношения
     test = relationship("Test", back_populates="questions")
@@ -68,6 +81,11 @@ class Question(Base):
 
 class TestResult(Base):
     __tablename__ = "test_results"
+    # Не больше одной незавершенной попытки пользователя на тест
+    __table_args__ = (
+        Index("uq_test_results_open_attempt", "test_id", "user_id", unique=True,
+              postgresql_where=text("completed_at IS NULL"), sqlite_where=text("completed_at IS NULL")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     test_id = Column(Integer, ForeignKey("tests.id"))
@@ -76,6 +94,8 @@ class TestResult(Base):
     max_score = Column(Integer)
     started_at = Column(DateTime, default=datetime.datetime.utcnow)
     completed_at = Column(DateTime)
+    # Последний вопрос, выданный адаптивным тестом; ответы принимаются только на него
+    served_question_id = Column(Integer, ForeignKey("questions.id"))
 
     # Отношения
     test = relationship("Test", back_populates="test_results")
@@ -84,14 +104,74 @@ class TestResult(Base):
 
 class Answer(Base):
     __tablename__ = "answers"
+    # Один ответ на вопрос в попытке: повторная отправка обновляет строку (см. crud.submit_answer)
+    __table_args__ = (UniqueConstraint("test_result_id", "question_id", name="uq_answers_test_result_question"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    test_result_id = Column(Integer, ForeignKey("test_results.id"))
+    test_result_id = Column(Integer, ForeignKey("test_results.id"), index=True)
     question_id = Column(Integer, ForeignKey("questions.id"))
-    answer_content = Column(JSON)
+    answer_content = Column(JSONType)
     is_correct = Column(Boolean)
     points_earned = Column(Integer)
+    # Ключ секционирования (см. archive.py): время начала попытки, общее для всех ее ответов
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    idempotency_key = Column(String)  # ключ последней примененной отправки
 
     # Отношения
     test_result = relationship("TestResult", back_populates="answers")
     question = relationship("Question", back_populates="answers")
+
+class LeaderboardEntry(Base):
+    # Лучший результат пользователя по тесту; источник для восстановления лидербордов (см. leaderboard.py)
+    __tablename__ = "leaderboard_entries"
+
+    test_id = Column(Integer, ForeignKey("tests.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    best_score = Column(Integer, nullable=False)
+    test_result_id = Column(Integer)
+    achieved_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# Полнотекстовый поиск по тестам и вопросам.
+# PostgreSQL: генерируемые tsvector-колонки с GIN-индексами (для существующих баз — миграция alembic).
+# SQLite (локальная разработка): внешние FTS5-таблицы, синхронизируемые триггерами.
+# Колонки не объявлены в моделях, чтобы схема оставалась совместимой с обоими диалектами.
+SEARCH_CONFIG = "simple"
+
+for _ddl in (
+    f"ALTER TABLE tests ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX ix_tests_search_vector ON tests USING GIN (search_vector)",
+):
+    event.listen(Test.__table__, "after_create", DDL(_ddl).execute_if(dialect="postgresql"))
+
+for _ddl in (
+    f"ALTER TABLE questions ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    f"to_tsvector('{SEARCH_CONFIG}', coalesce(question_text, ''))) STORED",
+    "CREATE INDEX ix_questions_search_vector ON questions USING GIN (search_vector)",
+):
+    event.listen(Question.__table__, "after_create", DDL(_ddl).execute_if(dialect="postgresql"))
+
+for _ddl in (
+    "CREATE VIRTUAL TABLE tests_fts USING fts5(title, description, content='tests', content_rowid='id')",
+    "CREATE TRIGGER tests_fts_ai AFTER INSERT ON tests BEGIN "
+    "INSERT INTO tests_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER tests_fts_ad AFTER DELETE ON tests BEGIN "
+    "INSERT INTO tests_fts(tests_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER tests_fts_au AFTER UPDATE ON tests BEGIN "
+    "INSERT INTO tests_fts(tests_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO tests_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+):
+    event.listen(Test.__table__, "after_create", DDL(_ddl).execute_if(dialect="sqlite"))
+
+for _ddl in (
+    "CREATE VIRTUAL TABLE questions_fts USING fts5(question_text, content='questions', content_rowid='id')",
+    "CREATE TRIGGER questions_fts_ai AFTER INSERT ON questions BEGIN "
+    "INSERT INTO questions_fts(rowid, question_text) VALUES (new.id, new.question_text); END",
+    "CREATE TRIGGER questions_fts_ad AFTER DELETE ON questions BEGIN "
+    "INSERT INTO questions_fts(questions_fts, rowid, question_text) VALUES ('delete', old.id, old.question_text); END",
+    "CREATE TRIGGER questions_fts_au AFTER UPDATE ON questions BEGIN "
+    "INSERT INTO questions_fts(questions_fts, rowid, question_text) VALUES ('delete', old.id, old.question_text); "
+    "INSERT INTO questions_fts(rowid, question_text) VALUES (new.id, new.question_text); END",
+):
+    event.listen(Question.__table__, "after_create", DDL(_ddl).execute_if(dialect="sqlite"))
@@ -20,6 +20,16 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserImportError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    username: Optional[str] = None
+    detail: str
+
+class UserImportResult(BaseModel):
+    created: int
+    errors: List[UserImportError]
+
 # Category schemas
 class CategoryBase(BaseModel):
     name: str
@@ -48,6 +58,31 @@ class QuestionCreate(QuestionBase):
 class Question(QuestionBase):
     id: int
     test_id: int
+    irt_discrimination: Optional[float] = None
+    irt_difficulty: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+def compact_options(options):
+    if options is None:
+        return options
+    return [option.get('text', str(option)) if isinstance(option, dict) else str(option) for option in options]
+
+# Вопрос в том виде, в котором его видит студент: без правильного ответа.
+# Варианты передаются плоским списком строк, номер варианта — его позиция в списке;
+# в ответе на multiple_choice студент может прислать индекс (или список индексов) вместо текста.
+class StudentQuestion(BaseModel):
+    id: int
+    test_id: int
+    question_text: str
+    question_type: str
+    options: Optional[List[str]] = None
+    points: int = 1
+
+    @validator('options', pre=True)
+    def validate_options(cls, v):
+        return compact_options(v)
 
     class Config:
         from_attributes = True
@@ -57,6 +92,8 @@ class TestBase(BaseModel):
     title: str
     description: Optional[str] = None
     time_limit: Optional[int] = None
+    is_adaptive: bool = False
+    adaptive_max_items: Optional[int] = None
 
 class TestCreate(TestBase):
     category_ids: List[int]
@@ -79,6 +116,14 @@ class Test(TestBase):
     class Config:
         from_attributes = True
 
+class StudentTest(TestBase):
+    id: int
+    questions: List[StudentQuestion]
+    categories: List[Category] = []
+
+    class Config:
+        from_attributes = True
+
 # Answer schemas
 class AnswerBase(BaseModel):
     answer_content: Any
@@ -86,15 +131,25 @@ class AnswerBase(BaseModel):
 class AnswerCreate(AnswerBase):
     question_id: int
     test_result_id: int
+    idempotency_key: Optional[str] = None  # повтор с тем же ключом не меняет сохраненный ответ
 
 class Answer(AnswerBase):
     id: int
+    question_id: int
     is_correct: bool
     points_earned: int
 
     class Config:
         from_attributes = True
 
+# Ответ в незавершенной попытке: без проверки, чтобы студент не мог перебрать варианты
+class StudentAnswer(AnswerBase):
+    id: int
+    question_id: int
+
+    class Config:
+        from_attributes = True
+
 # TestResult schemas
 class TestResultBase(BaseModel):
     test_id: int
@@ -114,6 +169,70 @@ class TestResult(TestResultBase):
     class Config:
         from_attributes = True
 
+class StudentTestResult(TestResultBase):
+    id: int
+    started_at: datetime
+    completed_at: Optional[datetime]
+    answers: List[StudentAnswer]
+
+    class Config:
+        from_attributes = True
+
+# Попытка прохождения: результат (с уже данными ответами для продолжения) и тест для студента
+class TestAttempt(BaseModel):
+    test_result: StudentTestResult
+    test: StudentTest
+    time_left: Optional[int] = None  # в секундах, если у теста есть ограничение по времени
+
+# Adaptive testing schemas
+class AdaptiveStep(BaseModel):
+    question: Optional[StudentQuestion] = None  # None — попытка закончена
+    finished: bool
+    answered: int
+    ability: float
+    standard_error: float
+
+class CalibrationResult(BaseModel):
+    calibrated: int
+    total: int
+
+# Similarity schemas
+class SimilarAnswer(BaseModel):
+    answer_id: int
+    test_result_id: int
+    user_id: int
+    answer_content: str
+
+class SimilarityCluster(BaseModel):
+    question_id: int
+    answers: List[SimilarAnswer]
+
+# Search schemas
+class SearchHit(BaseModel):
+    kind: str  # test или question
+    id: int
+    test_id: Optional[int] = None
+    text: Optional[str] = None
+    rank: float
+
+# Leaderboard schemas
+class LeaderboardRow(BaseModel):
+    rank: int
+    user_id: int
+    username: Optional[str] = None
+    score: int
+
+class LeaderboardPosition(BaseModel):
+    score: int
+    rank: int
+    total: int
+    percentile: float  # доля участников с результатом ниже, в процентах
+
+# Archive schemas
+class ArchiveResult(BaseModel):
+    archived_results: int
+    archived_answers: int
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
@@ -50,6 +50,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     user = crud.get_user_by_username(db, username=token_data.username)
     if user is None:
         raise credentials_exception
+    # Запоминаем пользователя, чтобы коммиты этой сессии включали для него read-your-writes
+    db.info["user_id"] = user.id
     return user
 
 async def get_current_active_user(current_user = Depends(get_current_user)):
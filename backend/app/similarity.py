@@ -0,0 +1,109 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Поиск подозрительно похожих открытых ответов: MinHash-сигнатуры + LSH по полосам.
+# Сравниваются только пары, попавшие в одну корзину хотя бы в одной полосе, поэтому
+# время работы почти линейно по числу ответов вместо попарного сравнения всех со всеми.
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+DEFAULT_THRESHOLD = 0.8
+# Пара со сходством ровно threshold должна стать кандидатом хотя бы с такой вероятностью
+MIN_CANDIDATE_PROBABILITY = 0.85
+SMALL_BUCKET_SIZE = 8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(42)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+
+def normalize(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(text: str) -> np.ndarray:
+    if len(text) <= SHINGLE_SIZE:
+        grams = {text}
+    else:
+        grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(hashes: np.ndarray) -> np.ndarray:
+    # Значения < 2^32, коэффициенты < 2^31: произведение помещается в uint64 без переполнения
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=1)
+
+
+def lsh_parameters(threshold: float) -> Tuple[int, int]:
+    """Число полос и строк в полосе для порога threshold.
+
+    Пара со сходством s становится кандидатом с вероятностью 1 - (1 - s^r)^b. Берется самое длинное
+    r (меньше всего лишних кандидатов), при котором пары на пороге еще находятся с вероятностью
+    MIN_CANDIDATE_PROBABILITY: для 0.8 это 16 полос по 8 строк, для 0.5 — 32 по 4.
+    """
+    rows = NUM_PERMUTATIONS
+    while rows > 1:
+        bands = NUM_PERMUTATIONS // rows
+        if 1 - (1 - threshold ** rows) ** bands >= MIN_CANDIDATE_PROBABILITY:
+            break
+        rows //= 2
+    return NUM_PERMUTATIONS // rows, rows
+
+
+def find_clusters(texts: List[str], threshold: float = DEFAULT_THRESHOLD) -> List[List[int]]:
+    """Группы индексов похожих текстов.
+
+    Группа — связная компонента графа, где ребро соединяет пару с оценкой сходства Жаккара не ниже
+    threshold. Поэтому в одну группу могут попасть тексты, похожие только через цепочку промежуточных.
+    """
+    normalized = [normalize(text) for text in texts]
+    indexes = [i for i, text in enumerate(normalized) if text]
+    if len(indexes) < 2:
+        return []
+    signatures = np.vstack([minhash(shingles(normalized[i])) for i in indexes])
+
+    bands, rows = lsh_parameters(threshold)
+    buckets: Dict[tuple, List[int]] = defaultdict(list)
+    for band in range(bands):
+        band_rows = signatures[:, band * rows:(band + 1) * rows]
+        for position, row in enumerate(band_rows):
+            buckets[(band, row.tobytes())].append(position)
+
+    parent = list(range(len(indexes)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    checked = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        # Маленькие корзины сравниваем попарно, большие — только с первым элементом,
+        # чтобы одна переполненная корзина не вернула квадратичную сложность
+        if len(members) <= SMALL_BUCKET_SIZE:
+            pairs = ((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+        else:
+            pairs = ((members[0], b) for b in members[1:])
+        for pair in pairs:
+            if pair in checked:
+                continue
+            checked.add(pair)
+            first, other = pair
+            if np.mean(signatures[first] == signatures[other]) >= threshold:
+                parent[find(other)] = find(first)
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for position in range(len(indexes)):
+        groups[find(position)].append(indexes[position])
+    return [members for members in groups.values() if len(members) > 1]
@@ -11,7 +11,7 @@ import {
     Chip,
 } from '@mui/material';
 import { useParams } from 'react-router-dom';
-import { TestResult, Question, Answer } from '../types';
+import { TestResult, Question, Answer, LeaderboardRow, LeaderboardPosition } from '../types';
 import * as api from '../services/api';
 
 interface DetailedTestResult extends TestResult {
@@ -22,15 +22,30 @@ const TestResults: React.FC = () => {
     const { resultId } = useParams<{ resultId: string }>();
     const [testResult, setTestResult] = useState<DetailedTestResult | null>(null);
     const [loading, setLoading] = useState(true);
+    const [leaderboard, setLeaderboard] = useState<LeaderboardRow[]>([]);
+    const [position, setPosition] = useState<LeaderboardPosition | null>(null);
 
     useEffect(() => {
         const fetchTestResult = async () => {
             try {
                 if (!resultId) return;
                 const result = await api.getTestResult(parseInt(resultId));
-                if (result && result.test) {
+                if (!result) return;
+                if (result.test) {
                     setTestResult(result as DetailedTestResult);
                 }
+                // Лидерборд нужен только test_id попытки и не зависит от детального разбора;
+                // он необязателен: ошибка не должна скрывать сами результаты
+                try {
+                    const [top, myPosition] = await Promise.all([
+                        api.getLeaderboard(result.test_id),
+                        api.getLeaderboardPosition(result.test_id),
+                    ]);
+                    setLeaderboard(top);
+                    setPosition(myPosition);
+                } catch (error) {
+                    console.error('Error fetching leaderboard:', error);
+                }
             } catch (error) {
                 console.error('Error fetching test result:', error);
             } finally {
@@ -48,7 +63,38 @@ const TestResults: React.FC = () => {
         );
     }
 
+    const leaderboardBlock = position && (
+        <Box sx={{ my: 3 }}>
+            <Typography variant="h6" gutterBottom>
+                Рейтинг
+            </Typography>
+            <Typography variant="body1" gutterBottom>
+                Место: {position.rank} из {position.total}. Ваш лучший результат выше, чем у{' '}
+                {position.percentile}% участников.
+            </Typography>
+            <List dense>
+                {leaderboard.map((row) => (
+                    <ListItem key={row.user_id} dense>
+                        <ListItemText
+                            primary={`${row.rank}. ${row.username ?? row.user_id}`}
+                            secondary={`${row.score} баллов`}
+                        />
+                    </ListItem>
+                ))}
+            </List>
+        </Box>
+    );
+
     if (!testResult) {
+        if (leaderboardBlock) {
+            return (
+                <Box sx={{ p: 3 }}>
+                    <Paper elevation={3} sx={{ p: 3 }}>
+                        {leaderboardBlock}
+                    </Paper>
+                </Box>
+            );
+        }
         return <Typography>Результаты не найдены</Typography>;
     }
 
@@ -95,6 +141,8 @@ const TestResults: React.FC = () => {
                     </Typography>
                 </Box>
 
+                {leaderboardBlock}
+
                 <Divider sx={{ my: 3 }} />
 
                 <Typography variant="h6" gutterBottom>
@@ -17,12 +17,12 @@ import {
     CircularProgress,
 } from '@mui/material';
 import * as api from '../services/api';
-import { Test, TestResult, Question } from '../types';
+import { StudentTest, TestResult } from '../types';
 
 const TestTaking: React.FC = () => {
     const { testId } = useParams<{ testId: string }>();
     const navigate = useNavigate();
-    const [test, setTest] = useState<Test | null>(null);
+    const [test, setTest] = useState<StudentTest | null>(null);
     const [currentQuestionIndex, setCurrentQuestionIndex] = useState(0);
     const [answers, setAnswers] = useState<Record<number, string>>({});
     const [testResult, setTestResult] = useState<TestResult | null>(null);
@@ -37,28 +37,55 @@ const TestTaking: React.FC = () => {
                     setLoading(false);
                     return;
                 }
-                console.log('Fetching test with ID:', testId);
-                
-                const fetchedTest = await api.getTest(parseInt(testId));
-                console.log('Fetched test (full):', JSON.stringify(fetchedTest, null, 2));
+                console.log('Starting test with ID:', testId);
+
+                // Один запрос: попытка, тест без ответов и уже сохраненные ответы
+                const attempt = await api.startTest(parseInt(testId));
+                if (attempt.test_result.completed_at) {
+                    // Время попытки истекло, сервер ее уже завершил
+                    navigate(`/test-results/${attempt.test_result.id}`);
+                    return;
+                }
+                const fetchedTest = attempt.test;
+                if (fetchedTest.is_adaptive) {
+                    // Вопросы адаптивного теста приходят по одному
+                    const step = await api.getNextQuestion(attempt.test_result.id);
+                    fetchedTest.questions = step.question ? [step.question] : [];
+                }
                 setTest(fetchedTest);
-                
-                // Начинаем тест
-                console.log('Starting test...');
-                const result = await api.startTest(parseInt(testId));
-                console.log('Test started (full):', JSON.stringify(result, null, 2));
-                setTestResult(result);
-                
+                setTestResult(attempt.test_result);
+
+                // Восстанавливаем ответы открытой попытки
+                const savedAnswers: Record<number, string> = {};
+                (attempt.test_result.answers || []).forEach((answer) => {
+                    const question = fetchedTest.questions.find((q) => q.id === answer.question_id);
+                    if (question?.question_type === 'multiple_choice') {
+                        // Сервер хранит текст варианта, а форма работает с его индексом
+                        const content = answer.answer_content as unknown;
+                        const option = Array.isArray(content) ? content[0] : content;
+                        const index = question.options?.indexOf(String(option)) ?? -1;
+                        if (index >= 0) {
+                            savedAnswers[answer.question_id] = String(index);
+                        }
+                    } else {
+                        savedAnswers[answer.question_id] = String(answer.answer_content);
+                    }
+                });
+                setAnswers(savedAnswers);
+                const firstUnanswered = fetchedTest.questions.findIndex(
+                    (question) => savedAnswers[question.id] === undefined
+                );
+                if (firstUnanswered > 0) {
+                    setCurrentQuestionIndex(firstUnanswered);
+                }
+
                 // Устанавливаем таймер
-                if (fetchedTest.time_limit) {
-                    console.log('Setting timer:', fetchedTest.time_limit);
-                    setTimeLeft(fetchedTest.time_limit * 60);
+                if (attempt.time_left != null) {
+                    console.log('Setting timer:', attempt.time_left);
+                    setTimeLeft(attempt.time_left);
                 }
 
-                // Проверяем вопросы
-                if (fetchedTest.questions && fetchedTest.questions.length > 0) {
-                    console.log('Current question:', fetchedTest.questions[currentQuestionIndex]);
-                } else {
+                if (!fetchedTest.questions || fetchedTest.questions.length === 0) {
                     console.warn('No questions found in the test!');
                 }
             } catch (error) {
@@ -69,20 +96,18 @@ const TestTaking: React.FC = () => {
         };
 
         fetchTest();
-    }, [testId, currentQuestionIndex]);
+    }, [testId]);
 
     useEffect(() => {
-        if (timeLeft === null || timeLeft <= 0) return;
+        if (timeLeft === null) return;
+        if (timeLeft <= 0) {
+            // Время вышло (на странице или до ее открытия) — завершаем попытку
+            handleComplete();
+            return;
+        }
 
         const timer = setInterval(() => {
-            setTimeLeft((prev) => {
-                if (prev === null || prev <= 0) {
-                    clearInterval(timer);
-                    handleComplete();
-                    return 0;
-                }
-                return prev - 1;
-            });
+            setTimeLeft((prev) => (prev === null ? prev : Math.max(prev - 1, 0)));
         }, 1000);
 
         return () => clearInterval(timer);
@@ -101,17 +126,35 @@ const TestTaking: React.FC = () => {
     const handleNextQuestion = async () => {
         if (!test || !testResult || !currentQuestion?.id) return;
 
-        // Сохраняем ответ на текущий вопрос
+        // Сохраняем ответ на текущий вопрос (для вариантов отправляем индекс)
+        const value = answers[currentQuestion.id] || '';
         try {
             await api.submitAnswer(testResult.id, {
                 question_id: currentQuestion.id,
                 test_result_id: testResult.id,
-                answer_content: answers[currentQuestion.id] || ''
+                answer_content:
+                    currentQuestion.question_type === 'multiple_choice' ? parseInt(value) : value
             });
         } catch (error) {
             console.error('Error submitting answer:', error);
         }
 
+        if (test.is_adaptive) {
+            try {
+                const step = await api.getNextQuestion(testResult.id);
+                if (step.finished || !step.question) {
+                    setShowConfirmDialog(true);
+                } else {
+                    const nextQuestion = step.question;
+                    setTest((prev) => prev && { ...prev, questions: [...prev.questions, nextQuestion] });
+                    setCurrentQuestionIndex((prev) => prev + 1);
+                }
+            } catch (error) {
+                console.error('Error fetching next question:', error);
+            }
+            return;
+        }
+
         if (currentQuestionIndex < test.questions.length - 1) {
             setCurrentQuestionIndex((prev) => prev + 1);
         } else {
@@ -190,7 +233,10 @@ const TestTaking: React.FC = () => {
 
             <Box sx={{ my: 4 }}>
                 <Typography variant="h6" gutterBottom>
-                    Вопрос {currentQuestionIndex + 1} из {test.questions.length}
+                    Вопрос {currentQuestionIndex + 1}
+                    {test.is_adaptive
+                        ? test.adaptive_max_items && ` из ${test.adaptive_max_items}`
+                        : ` из ${test.questions.length}`}
                 </Typography>
                 <Typography variant="body1" gutterBottom>
                     {currentQuestion.question_text}
@@ -209,7 +255,7 @@ const TestTaking: React.FC = () => {
                                 {currentQuestion.options?.map((option, index) => (
                                     <FormControlLabel
                                         key={index}
-                                        value={option}
+                                        value={String(index)}
                                         control={<Radio />}
                                         label={option}
                                     />
@@ -234,7 +280,7 @@ const TestTaking: React.FC = () => {
                     <Button
                         variant="outlined"
                         onClick={handlePrevQuestion}
-                        disabled={currentQuestionIndex === 0}
+                        disabled={currentQuestionIndex === 0 || test.is_adaptive}
                     >
                         Назад
                     </Button>
@@ -243,7 +289,7 @@ const TestTaking: React.FC = () => {
                         onClick={handleNextQuestion}
                         disabled={!answers[questionId]}
                     >
-                        {currentQuestionIndex === test.questions.length - 1
+                        {!test.is_adaptive && currentQuestionIndex === test.questions.length - 1
                             ? 'Завершить'
                             : 'Следующий'}
                     </Button>
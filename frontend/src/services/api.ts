@@ -1,5 +1,16 @@
 import axios from 'axios';
-import { User, Test, Category, Question, TestResult, Answer } from '../types';
+import {
+    User,
+    Test,
+    Category,
+    Question,
+    TestResult,
+    Answer,
+    TestAttempt,
+    AdaptiveStep,
+    LeaderboardRow,
+    LeaderboardPosition,
+} from '../types';
 
 const API_URL = 'http://localhost:8000';
 
@@ -70,17 +81,33 @@ export const createQuestion = async (question: Partial<Question>): Promise<Quest
 };
 
 // Test Results
-export const startTest = async (testId: number): Promise<TestResult> => {
-    const currentUser = await getCurrentUser();
-    const response = await axios.post(`${API_URL}/test-results`, { 
-        test_id: testId,
-        user_id: currentUser.id
-    });
+// Создает попытку (или продолжает открытую) и возвращает тест без правильных ответов одним запросом
+export const startTest = async (testId: number): Promise<TestAttempt> => {
+    const response = await axios.post(`${API_URL}/tests/${testId}/start/`);
     return response.data;
 };
 
+// Ключ идемпотентности зависит от содержимого ответа: повторная отправка того же ответа
+// (двойной клик, повтор после сетевой ошибки) ничего не меняет на сервере
+const answerIdempotencyKey = (testResultId: number, answer: Partial<Answer>): string => {
+    const content = JSON.stringify(answer.answer_content ?? '');
+    let hash = 5381;
+    for (let i = 0; i < content.length; i++) {
+        hash = ((hash << 5) + hash + content.charCodeAt(i)) | 0;
+    }
+    return `${testResultId}-${answer.question_id}-${(hash >>> 0).toString(16)}`;
+};
+
 export const submitAnswer = async (testResultId: number, answer: Partial<Answer>): Promise<Answer> => {
-    const response = await axios.post(`${API_URL}/test-results/${testResultId}/answers`, answer);
+    const response = await axios.post(`${API_URL}/test-results/${testResultId}/submit-answer/`, answer, {
+        headers: { 'Idempotency-Key': answerIdempotencyKey(testResultId, answer) },
+    });
+    return response.data;
+};
+
+// Адаптивный тест: следующий вопрос подбирается сервером по уже данным ответам
+export const getNextQuestion = async (testResultId: number): Promise<AdaptiveStep> => {
+    const response = await axios.post(`${API_URL}/test-results/${testResultId}/next-question/`);
     return response.data;
 };
 
@@ -93,3 +120,14 @@ export const getTestResult = async (testResultId: number): Promise<TestResult> =
     const response = await axios.get(`${API_URL}/test-results/${testResultId}`);
     return response.data;
 };
+
+// Leaderboards
+export const getLeaderboard = async (testId: number, limit = 10): Promise<LeaderboardRow[]> => {
+    const response = await axios.get(`${API_URL}/tests/${testId}/leaderboard/`, { params: { limit } });
+    return response.data;
+};
+
+export const getLeaderboardPosition = async (testId: number): Promise<LeaderboardPosition> => {
+    const response = await axios.get(`${API_URL}/tests/${testId}/leaderboard/position/`);
+    return response.data;
+};
@@ -37,11 +37,39 @@ export interface Test {
     questions: Question[];
 }
 
+export interface StudentQuestion {
+    id: number;
+    test_id: number;
+    question_text: string;
+    question_type: 'multiple_choice' | 'open_ended';
+    options?: string[];
+    points: number;
+}
+
+export interface StudentTest {
+    id: number;
+    title: string;
+    description: string;
+    time_limit: number | null;
+    is_adaptive?: boolean;
+    adaptive_max_items?: number;
+    questions: StudentQuestion[];
+    categories?: Category[];
+}
+
+export interface AdaptiveStep {
+    question: StudentQuestion | null;
+    finished: boolean;
+    answered: number;
+    ability: number;
+    standard_error: number;
+}
+
 export interface Answer {
     id?: number;
     question_id: number;
     test_result_id: number;
-    answer_content: string;
+    answer_content: string | number;
     is_correct?: boolean;
 }
 
@@ -52,9 +80,32 @@ export interface TestResult {
     score: number;
     completion_time: number;
     completed: boolean;
+    started_at?: string;
+    completed_at?: string | null;
+    answers?: Answer[];
     test?: Test;
 }
 
+export interface TestAttempt {
+    test_result: TestResult;
+    test: StudentTest;
+    time_left: number | null;
+}
+
+export interface LeaderboardRow {
+    rank: number;
+    user_id: number;
+    username?: string;
+    score: number;
+}
+
+export interface LeaderboardPosition {
+    score: number;
+    rank: number;
+    total: number;
+    percentile: number;
+}
+
 export interface DetailedTestResult extends TestResult {
     test: Test;
     questions: (Question & { userAnswer?: Answer })[];